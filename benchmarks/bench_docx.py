@@ -0,0 +1,94 @@
+import argparse
+import difflib
+import os
+import sys
+import tempfile
+import time
+import docx
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.shared import Pt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import scrapper
+
+SAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "samples", "docx")
+EXPECTED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "samples", "docx_expected")
+TABLE_COUNTS = [1, 5, 10, 20, 40]
+DIFF_LINES = 20
+
+def build_fixture(path, tables, rows=15, cols=5):
+    document = docx.Document()
+    paragraph = document.add_paragraph()
+    paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    run = paragraph.add_run("Перечень вступительных испытаний")
+    run.bold = True
+    run.font.size = Pt(14)
+    for t in range(tables):
+        paragraph = document.add_paragraph()
+        run = paragraph.add_run(f"Направление подготовки {t + 1}")
+        run.font.size = Pt(12)
+        table = document.add_table(rows=rows, cols=cols)
+        table.cell(0, 0).text = f"Таблица {t + 1}"
+        for j in range(1, cols):
+            table.cell(0, j).text = f"Испытание {j}"
+        for i in range(1, rows):
+            for j in range(cols):
+                table.cell(i, j).text = f"{t + 1}.{i}.{j}"
+    document.save(path)
+
+def convert(path, store_dir):
+    started = time.perf_counter()
+    scrapper.process_docx(path, "bench", "https://abiturient.asu.ru/bench.docx")
+    elapsed = time.perf_counter() - started
+    output_path = os.path.join(store_dir, "bench.txt")
+    with open(output_path, "r", encoding="utf-8") as infile:
+        output = infile.read()
+    os.remove(output_path)
+    return elapsed, output
+
+def compare_expected(name, output, update):
+    expected_path = os.path.join(EXPECTED_DIR, name + ".txt")
+    if update:
+        os.makedirs(EXPECTED_DIR, exist_ok=True)
+        with open(expected_path, "w", encoding="utf-8") as outfile:
+            outfile.write(output)
+        return ""
+    if not os.path.exists(expected_path):
+        return f"ОШИБКА: нет эталона {expected_path}, запустите с --update-expected"
+    with open(expected_path, "r", encoding="utf-8") as infile:
+        expected = infile.read()
+    if output == expected:
+        return ""
+    diff = difflib.unified_diff(expected.splitlines(), output.splitlines(), expected_path, "результат", lineterm="")
+    print("\n".join(list(diff)[:DIFF_LINES]))
+    return f"ОШИБКА: результат отличается от {expected_path}"
+
+def report(name, elapsed, output, problems=""):
+    print(f"{name:<32} {elapsed * 1000:>9.1f} мс {len(output.splitlines()):>8} строк {len(output.encode()):>10} байт {problems}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Время конвертации DOCX и размер результата")
+    parser.add_argument("--samples", default=SAMPLES_DIR, help="каталог с реальными DOCX-файлами приемной комиссии")
+    parser.add_argument("--update-expected", action="store_true",
+                        help="перезаписать эталонные результаты синтетических файлов после намеренного изменения конвертера")
+    args = parser.parse_args()
+    failures = 0
+    with tempfile.TemporaryDirectory() as work_dir:
+        scrapper.DIR_TO_STORE = work_dir
+        for tables in TABLE_COUNTS:
+            name = f"tables_{tables}"
+            path = os.path.join(work_dir, name + ".docx")
+            build_fixture(path, tables)
+            elapsed, output = convert(path, work_dir)
+            problems = compare_expected(name, output, args.update_expected)
+            failures += bool(problems)
+            report(f"синтетический, таблиц: {tables}", elapsed, output, problems)
+        if os.path.isdir(args.samples):
+            for filename in sorted(os.listdir(args.samples)):
+                if filename.endswith(".docx"):
+                    elapsed, output = convert(os.path.join(args.samples, filename), work_dir)
+                    report(filename, elapsed, output)
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
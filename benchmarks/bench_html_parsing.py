@@ -0,0 +1,69 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+from bs4 import BeautifulSoup
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import scrapper
+
+SAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "samples", "html")
+
+class StoredResponse:
+    def __init__(self, text):
+        self.text = text
+
+def load_samples(directory):
+    samples = []
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith((".html", ".htm")):
+            with open(os.path.join(directory, filename), "r", encoding="utf-8") as infile:
+                link = f"https://abiturient.asu.ru/bench/{os.path.splitext(filename)[0]}"
+                samples.append((link, StoredResponse(infile.read())))
+    return samples
+
+def two_pass(link, response):
+    scrapper.parsing_html(response, link)
+    soup = BeautifulSoup(response.text, "lxml")
+    content = []
+    for anchor in soup.find_all('a'):
+        new_link = scrapper.transform_link(anchor.get('href'))
+        if new_link:
+            content.append(new_link)
+    return np.unique(np.array(content))
+
+def single_pass(link, response):
+    return scrapper.parsing_html(response, link, with_links=True)[1]
+
+def measure(function, samples, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for link, response in samples:
+            function(link, response)
+    elapsed = time.perf_counter() - started
+    return len(samples) * repeat / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение двойного и однопроходного разбора HTML-страниц")
+    parser.add_argument("--samples", default=SAMPLES_DIR, help="каталог с HTML-страницами; в репозитории только синтетическая страница, для замеров добавьте сохраненные страницы abiturient.asu.ru")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    samples = load_samples(args.samples)
+    if not samples:
+        print(f"В каталоге {args.samples} нет HTML-страниц")
+        return
+    with tempfile.TemporaryDirectory() as store_dir:
+        scrapper.DIR_TO_STORE = store_dir
+        for link, response in samples:
+            if sorted(two_pass(link, response)) != sorted(single_pass(link, response)):
+                print(f"Наборы ссылок различаются: {link}")
+        old_rate = measure(two_pass, samples, args.repeat)
+        new_rate = measure(single_pass, samples, args.repeat)
+    print(f"Страниц: {len(samples)}, парсер: {scrapper.HTML_PARSER}")
+    print(f"Два разбора + np.unique: {old_rate:.1f} стр/сек")
+    print(f"Один разбор:             {new_rate:.1f} стр/сек ({new_rate / old_rate:.2f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import argparse
+import json
+import math
+import os
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from telegram_stub import TRACES_PATH
+
+REQUESTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "requests.jsonl")
+CHAT_ID_BASE = 1000000
+
+def load_questions(path):
+    questions = []
+    with open(path, "r", encoding="utf-8") as infile:
+        for line in infile:
+            if line.strip():
+                questions.append(json.loads(line)["text"])
+    return questions
+
+def build_update(update_id, chat_id, text):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Абитуриент"},
+            "text": text,
+        },
+    }
+
+def post_update(url, update):
+    data = json.dumps(update, ensure_ascii=False).encode("utf-8")
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status
+    except Exception as e:
+        print(f"Ошибка отправки обновления {update['update_id']}: {e}")
+        return None
+
+def fetch_json(url):
+    with urllib.request.urlopen(url, timeout=10) as response:
+        return json.loads(response.read().decode("utf-8"))
+
+def fetch_traces(telegram_url):
+    snapshot = fetch_json(telegram_url.rstrip("/") + TRACES_PATH)
+    traces = {int(chat_id): trace for chat_id, trace in snapshot["traces"].items()}
+    return traces, snapshot["calls"]
+
+def wait_ready(app_url, timeout):
+    ready_url = app_url.rstrip("/") + "/readyz"
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(ready_url, timeout=5) as response:
+                if response.status == 200:
+                    return True
+        except Exception:
+            pass
+        time.sleep(0.5)
+    return False
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def replay(args, questions):
+    webhook_url = args.app.rstrip("/") + "/telegram_webhook"
+    update_base = int(time.time()) * 1000
+    sent = {}
+    statuses = []
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=args.senders) as executor:
+        futures = []
+        for i in range(args.count):
+            delay = started + i / args.rate - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            chat_id = CHAT_ID_BASE + i
+            sent[chat_id] = time.time()
+            update = build_update(update_base + i, chat_id, questions[i % len(questions)])
+            futures.append(executor.submit(post_update, webhook_url, update))
+        statuses = [future.result() for future in futures]
+    deadline = time.time() + args.timeout
+    while time.time() < deadline:
+        now = time.time()
+        traces, _ = fetch_traces(args.telegram_url)
+        if all(traces.get(chat_id, {}).get("last_reply_at") and now - traces[chat_id]["last_reply_at"] >= args.settle
+               for chat_id in sent):
+            break
+        time.sleep(0.5)
+    return sent, statuses, started
+
+def report(traces, calls, sent, statuses, started, args):
+    ack, first, full = [], [], []
+    finished = started
+    for chat_id, sent_at in sent.items():
+        trace = traces.get(chat_id)
+        if trace is None:
+            continue
+        if trace["ack_at"]:
+            ack.append(trace["ack_at"] - sent_at)
+        if trace["last_reply_at"]:
+            first.append(trace["first_reply_at"] - sent_at)
+            full.append(trace["last_reply_at"] - sent_at)
+            finished = max(finished, trace["last_reply_at"])
+    rejected = sum(1 for status in statuses if status != 200)
+    duration = finished - started
+    print(f"Отправлено обновлений: {len(sent)}, целевая частота {args.rate:.2f}/с")
+    print(f"Ошибок вебхука: {rejected}, без ответа: {len(sent) - len(full)}")
+    print(f"Пропускная способность: {len(full) / duration if duration > 0 else 0:.2f} ответов/с за {duration:.1f} с")
+    print(f"{'метрика':<26} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for name, values in (("подтверждение, с", ack), ("первый фрагмент ответа, с", first), ("полный ответ, с", full)):
+        if values:
+            print(f"{name:<26} {percentile(values, 50):>8.2f} {percentile(values, 95):>8.2f} "
+                  f"{percentile(values, 99):>8.2f} {max(values):>8.2f}")
+    print(f"Вызовы Bot API: {calls}")
+    return len(full) == len(sent) and not rejected
+
+def print_stage_metrics(app_url):
+    try:
+        with urllib.request.urlopen(app_url.rstrip("/") + "/metrics", timeout=10) as response:
+            text = response.read().decode("utf-8")
+    except Exception as e:
+        print(f"Не удалось получить /metrics: {e}")
+        return
+    sums, counts = {}, {}
+    for line in text.splitlines():
+        for prefix, target in (("rag_stage_seconds_sum", sums), ("rag_stage_seconds_count", counts)):
+            if line.startswith(prefix + "{"):
+                labels, value = line[len(prefix):].rsplit(" ", 1)
+                target[labels.split('"')[1]] = float(value)
+    print("Среднее время этапов с запуска сервера (/metrics):")
+    for stage in sorted(counts):
+        if counts[stage]:
+            print(f"  {stage:<20} {sums[stage] / counts[stage]:>8.3f} с  ({int(counts[stage])})")
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота: воспроизведение обновлений Telegram")
+    parser.add_argument("--app", default="http://127.0.0.1:8000", help="адрес запущенного main.py")
+    parser.add_argument("--requests", default=REQUESTS_PATH, help="jsonl-файл с вопросами в поле text")
+    parser.add_argument("--count", type=int, default=0, help="число обновлений, по умолчанию по числу вопросов")
+    parser.add_argument("--rate", type=float, default=2.0, help="обновлений в секунду")
+    parser.add_argument("--telegram-url", default="http://127.0.0.1:8081",
+                        help="адрес запущенной telegram_stub.py, тот же, что в TELEGRAM_API_URL")
+    parser.add_argument("--ready-timeout", type=float, default=300.0, help="максимальное ожидание /readyz, с")
+    parser.add_argument("--settle", type=float, default=3.0, help="пауза без правок, после которой ответ считается полным, с")
+    parser.add_argument("--timeout", type=float, default=600.0, help="максимальное ожидание ответов, с")
+    parser.add_argument("--senders", type=int, default=16, help="потоков для отправки обновлений")
+    args = parser.parse_args()
+    questions = load_questions(args.requests)
+    if not questions:
+        print(f"В {args.requests} нет вопросов")
+        sys.exit(1)
+    args.count = args.count or len(questions)
+    if not wait_ready(args.app, args.ready_timeout):
+        print(f"{args.app} не ответил на /readyz за {args.ready_timeout:.0f} с")
+        sys.exit(1)
+    sent, statuses, started = replay(args, questions)
+    traces, calls = fetch_traces(args.telegram_url)
+    ok = report(traces, calls, sent, statuses, started, args)
+    print_stage_metrics(args.app)
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ANSWER_WORDS = (
+    "Для поступления на направление подготовки необходимо подать заявление через личный кабинет "
+    "абитуриента и предоставить результаты ЕГЭ по профильным предметам. Подробные сроки приема "
+    "документов и перечень вступительных испытаний опубликованы на сайте приемной комиссии. "
+    "Желаем успешного поступления в АлтГУ!"
+).split()
+
+class StubSettings:
+    def __init__(self, args):
+        self.prefill_latency = args.prefill_latency
+        self.prefill_per_1k_chars = args.prefill_per_1k_chars
+        self.tokens_per_second = args.tokens_per_second
+        self.answer_tokens = args.answer_tokens
+        self.embed_latency = args.embed_latency
+        self.dimensions = args.dimensions
+        self.generation_slots = threading.Semaphore(args.parallel)
+
+def now_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+def fake_embedding(text, dimensions):
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+    rng = random.Random(seed)
+    vector = [rng.gauss(0, 1) for _ in range(dimensions)]
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+def answer_tokens(count):
+    return [ANSWER_WORDS[i % len(ANSWER_WORDS)] + " " for i in range(count)]
+
+class OllamaStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    settings = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_json({}, send_body=False)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self.send_json({"models": []})
+        elif self.path == "/api/version":
+            self.send_json({"version": "0.0.0-stub"})
+        else:
+            self.send_text("Ollama is running")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if self.path == "/api/generate":
+            self.generate(body, chat=False)
+        elif self.path == "/api/chat":
+            self.generate(body, chat=True)
+        elif self.path == "/api/embed":
+            self.embed(body)
+        elif self.path == "/api/embeddings":
+            self.embeddings(body)
+        else:
+            self.send_json({"error": f"unknown endpoint {self.path}"}, status=404)
+
+    def send_json(self, payload, status=200, send_body=True):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(data)
+
+    def send_text(self, text):
+        data = text.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def write_chunk(self, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n"
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def generate(self, body, chat):
+        settings = self.settings
+        model = body.get("model", "")
+        if chat:
+            prompt = "".join(message.get("content", "") for message in body.get("messages", []))
+        else:
+            prompt = body.get("prompt", "")
+        stream = body.get("stream", True)
+        if not prompt:
+            self.send_json(self.message(model, "", chat, done=True, done_reason="load"))
+            return
+        tokens = answer_tokens(settings.answer_tokens)
+        prefill = settings.prefill_latency + len(prompt) / 1000 * settings.prefill_per_1k_chars
+        interval = 1 / settings.tokens_per_second if settings.tokens_per_second > 0 else 0
+        started = time.perf_counter()
+        with settings.generation_slots:
+            time.sleep(prefill)
+            if not stream:
+                time.sleep(interval * len(tokens))
+                final = self.message(model, "".join(tokens), chat, done=True, done_reason="stop")
+                final.update(self.durations(started, prompt, tokens))
+                self.send_json(final)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for token in tokens:
+                self.write_chunk(self.message(model, token, chat, done=False))
+                time.sleep(interval)
+        final = self.message(model, "", chat, done=True, done_reason="stop")
+        final.update(self.durations(started, prompt, tokens))
+        self.write_chunk(final)
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def message(self, model, text, chat, done, done_reason=None):
+        payload = {"model": model, "created_at": now_iso(), "done": done}
+        if chat:
+            payload["message"] = {"role": "assistant", "content": text}
+        else:
+            payload["response"] = text
+        if done:
+            payload["done_reason"] = done_reason
+        return payload
+
+    def durations(self, started, prompt, tokens):
+        return {
+            "total_duration": int((time.perf_counter() - started) * 1e9),
+            "prompt_eval_count": len(prompt) // 4,
+            "eval_count": len(tokens),
+        }
+
+    def embed(self, body):
+        texts = body.get("input", "")
+        if isinstance(texts, str):
+            texts = [texts]
+        time.sleep(self.settings.embed_latency)
+        self.send_json({
+            "model": body.get("model", ""),
+            "embeddings": [fake_embedding(text, self.settings.dimensions) for text in texts],
+        })
+
+    def embeddings(self, body):
+        time.sleep(self.settings.embed_latency)
+        self.send_json({"embedding": fake_embedding(body.get("prompt", ""), self.settings.dimensions)})
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка Ollama API для нагрузочного тестирования без GPU")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--prefill-latency", type=float, default=0.5, help="задержка до первого токена, с")
+    parser.add_argument("--prefill-per-1k-chars", type=float, default=0.05,
+                        help="дополнительная задержка до первого токена на 1000 символов промпта, с")
+    parser.add_argument("--tokens-per-second", type=float, default=30, help="скорость генерации токенов")
+    parser.add_argument("--answer-tokens", type=int, default=120, help="длина ответа в токенах")
+    parser.add_argument("--embed-latency", type=float, default=0.02, help="задержка запроса эмбеддингов, с")
+    parser.add_argument("--dimensions", type=int, default=1024, help="размерность эмбеддингов")
+    parser.add_argument("--parallel", type=int, default=1, help="число одновременных генераций, как OLLAMA_NUM_PARALLEL")
+    args = parser.parse_args()
+    OllamaStubHandler.settings = StubSettings(args)
+    server = ThreadingHTTPServer((args.host, args.port), OllamaStubHandler)
+    server.daemon_threads = True
+    print(f"Заглушка Ollama слушает http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+PLACEHOLDER_PREFIX = "Обрабатываю"
+TRACES_PATH = "/_traces"
+
+class ChatTrace:
+    def __init__(self):
+        self.ack_at = None
+        self.first_reply_at = None
+        self.last_reply_at = None
+        self.replies = 0
+
+    def as_dict(self):
+        return {
+            "ack_at": self.ack_at,
+            "first_reply_at": self.first_reply_at,
+            "last_reply_at": self.last_reply_at,
+            "replies": self.replies,
+        }
+
+class TelegramStub:
+    def __init__(self, host="127.0.0.1", port=8081):
+        self.lock = threading.Lock()
+        self.traces = {}
+        self.message_id = 0
+        self.calls = {}
+
+        class Handler(TelegramStubHandler):
+            pass
+
+        Handler.stub = self
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "calls": dict(self.calls),
+                "traces": {str(chat_id): trace.as_dict() for chat_id, trace in self.traces.items()},
+            }
+
+    def record(self, method, params):
+        now = time.time()
+        with self.lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            if method not in ("sendMessage", "editMessageText"):
+                return
+            chat_id = int(params.get("chat_id", 0))
+            trace = self.traces.setdefault(chat_id, ChatTrace())
+            if method == "sendMessage" and str(params.get("text", "")).startswith(PLACEHOLDER_PREFIX):
+                trace.ack_at = trace.ack_at or now
+                return
+            trace.first_reply_at = trace.first_reply_at or now
+            trace.last_reply_at = now
+            trace.replies += 1
+
+    def next_message_id(self):
+        with self.lock:
+            self.message_id += 1
+            return self.message_id
+
+def read_params(handler):
+    length = int(handler.headers.get("Content-Length", 0))
+    raw = handler.rfile.read(length).decode("utf-8") if length else ""
+    content_type = handler.headers.get("Content-Type", "")
+    if "application/json" in content_type:
+        return json.loads(raw or "{}")
+    return {key: values[0] for key, values in parse_qs(raw).items()}
+
+class TelegramStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    stub = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.rstrip("/") == TRACES_PATH:
+            self.send_json(self.stub.snapshot())
+        else:
+            self.do_POST()
+
+    def do_POST(self):
+        method = self.path.rstrip("/").rsplit("/", 1)[-1]
+        params = read_params(self)
+        self.stub.record(method, params)
+        self.send_json({"ok": True, "result": self.result(method, params)})
+
+    def result(self, method, params):
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        if method == "getWebhookInfo":
+            return {"url": "", "has_custom_certificate": False, "pending_update_count": 0}
+        if method in ("sendMessage", "editMessageText"):
+            message_id = params.get("message_id") or self.stub.next_message_id()
+            return {
+                "message_id": int(message_id),
+                "date": int(time.time()),
+                "chat": {"id": int(params.get("chat_id", 0)), "type": "private"},
+                "text": params.get("text", ""),
+            }
+        return True
+
+    def send_json(self, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка Telegram Bot API для нагрузочного тестирования")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+    stub = TelegramStub(args.host, args.port)
+    print(f"Заглушка Bot API слушает http://{args.host}:{args.port}/bot, трассы ответов: {TRACES_PATH}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(f"Вызовы Bot API: {stub.calls}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from collections import OrderedDict, deque
+from storage.shared import connect
+
+logger = logging.getLogger(__name__)
+
+class UpdateDispatcher:
+    def __init__(self, process, workers=8, max_pending=100, lease=None):
+        self.process = process
+        self.lease = lease
+        self.workers_count = workers
+        self.max_pending = max_pending
+        self.ready = asyncio.Queue()
+        self.pending = {}
+        self.pending_count = 0
+        self.workers = []
+
+    def start(self):
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(self.workers_count)]
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    def submit(self, update):
+        if self.pending_count >= self.max_pending:
+            return False
+        key = update.effective_chat.id if update.effective_chat else f"update:{update.update_id}"
+        self.pending_count += 1
+        if key in self.pending:
+            self.pending[key].append(update)
+        else:
+            self.pending[key] = deque([update])
+            self.ready.put_nowait(key)
+        return True
+
+    async def _worker(self):
+        while True:
+            key = await self.ready.get()
+            updates = self.pending[key]
+            while updates:
+                update = updates.popleft()
+                try:
+                    if self.lease is not None and update.effective_chat:
+                        async with self.lease.hold(update.effective_chat.id):
+                            await self.process(update)
+                    else:
+                        await self.process(update)
+                except Exception as e:
+                    logger.error("Error processing update %s: %s", update.update_id, e)
+                finally:
+                    self.pending_count -= 1
+            del self.pending[key]
+            self.ready.task_done()
+
+class UpdateDeduplicator:
+    def __init__(self, window=600, max_size=10000):
+        self.window = window
+        self.max_size = max_size
+        self.seen = OrderedDict()
+        self.duplicates = 0
+        self.saved_llm_calls = 0
+
+    def count_duplicate(self, update):
+        self.duplicates += 1
+        text = update.message.text if update.message else None
+        if text and not text.startswith("/"):
+            self.saved_llm_calls += 1
+
+    def is_duplicate(self, update):
+        now = time.time()
+        while self.seen:
+            update_id, seen_at = next(iter(self.seen.items()))
+            if now - seen_at <= self.window and len(self.seen) < self.max_size:
+                break
+            del self.seen[update_id]
+        if update.update_id not in self.seen:
+            self.seen[update.update_id] = now
+            return False
+        self.count_duplicate(update)
+        return True
+
+    async def check(self, update):
+        return self.is_duplicate(update)
+
+    def stats(self):
+        return {"tracked": len(self.seen), "duplicates": self.duplicates, "saved_llm_calls": self.saved_llm_calls}
+
+class SQLiteUpdateDeduplicator(UpdateDeduplicator):
+    def __init__(self, path, window=600, cleanup_interval=60):
+        super().__init__(window=window)
+        self.cleanup_interval = cleanup_interval
+        self.last_cleanup = 0
+        self.lock = threading.Lock()
+        self.connection = connect(path)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS seen_updates (
+                update_id INTEGER PRIMARY KEY,
+                seen_at REAL NOT NULL
+            )
+        """)
+        self.connection.commit()
+
+    async def check(self, update):
+        if super().is_duplicate(update):
+            return True
+        if await asyncio.to_thread(self._remember, update.update_id):
+            return False
+        self.count_duplicate(update)
+        return True
+
+    def is_duplicate(self, update):
+        if super().is_duplicate(update):
+            return True
+        if self._remember(update.update_id):
+            return False
+        self.count_duplicate(update)
+        return True
+
+    def _remember(self, update_id):
+        now = time.time()
+        with self.lock, self.connection:
+            if now - self.last_cleanup > self.cleanup_interval:
+                self.last_cleanup = now
+                self.connection.execute("DELETE FROM seen_updates WHERE seen_at < ?", (now - self.window,))
+            return self.connection.execute(
+                "INSERT OR IGNORE INTO seen_updates (update_id, seen_at) VALUES (?, ?)",
+                (update_id, now)
+            ).rowcount > 0
+
+    def stats(self):
+        with self.lock:
+            tracked = self.connection.execute("SELECT COUNT(*) FROM seen_updates").fetchone()[0]
+        return {"tracked": tracked, "duplicates": self.duplicates, "saved_llm_calls": self.saved_llm_calls}
+
+class SQLiteChatLease:
+    def __init__(self, path, ttl=300, poll_interval=0.1):
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex}"
+        self.lock = threading.Lock()
+        self.connection = connect(path)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS chat_leases (
+                chat_id INTEGER PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        self.connection.commit()
+
+    def _try_acquire(self, chat_id):
+        now = time.time()
+        with self.lock, self.connection:
+            return self.connection.execute(
+                "INSERT INTO chat_leases (chat_id, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(chat_id) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE chat_leases.expires_at < ?",
+                (chat_id, self.owner, now + self.ttl, now)
+            ).rowcount > 0
+
+    def _renew(self, chat_id):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "UPDATE chat_leases SET expires_at = ? WHERE chat_id = ? AND owner = ?",
+                (time.time() + self.ttl, chat_id, self.owner)
+            )
+
+    def _release(self, chat_id):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "DELETE FROM chat_leases WHERE chat_id = ? AND owner = ?", (chat_id, self.owner)
+            )
+
+    async def _keep_alive(self, chat_id):
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            await asyncio.to_thread(self._renew, chat_id)
+
+    @asynccontextmanager
+    async def hold(self, chat_id):
+        while not await asyncio.to_thread(self._try_acquire, chat_id):
+            await asyncio.sleep(self.poll_interval)
+        keep_alive = asyncio.create_task(self._keep_alive(chat_id))
+        try:
+            yield
+        finally:
+            keep_alive.cancel()
+            await asyncio.to_thread(self._release, chat_id)
+
+def create_chat_lease(backend, path, ttl):
+    if backend == "memory":
+        return None
+    if backend == "sqlite":
+        return SQLiteChatLease(path, ttl=ttl)
+    raise ValueError(f"Unknown lease backend: {backend}")
+
+def create_update_deduplicator(backend, path, window):
+    if backend == "memory":
+        return UpdateDeduplicator(window=window)
+    if backend == "sqlite":
+        return SQLiteUpdateDeduplicator(path, window=window)
+    raise ValueError(f"Unknown deduplication backend: {backend}")
@@ -1,15 +1,31 @@
 import hashlib
+import json
 import os
 import shutil
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import chromadb
 from langchain_community.document_loaders import TextLoader
 from langchain.text_splitter import MarkdownTextSplitter, RecursiveCharacterTextSplitter
 from langchain.schema import Document
-from langchain_chroma import Chroma
 from langchain_ollama import OllamaEmbeddings
+from storage.chunk_index import CHUNK_INDEX_FILE, build_chunk_index, save_chunk_index
+from storage.dedup_index import DedupIndex
+from storage.lexical_index import LEXICAL_INDEX_FILE, build_lexical_index, save_lexical_index
 
-CHROMA_PATH = "./db_metadata_v5"
+CHROMA_PATH = os.environ.get("CHROMA_PATH", "./db_metadata_v5")
 DATA_PATH = "./docs"
-global_unique_hashes = set()
+COLLECTION_NAME = "langchain"
+EMBED_BATCH_SIZE = 64
+EMBED_CONCURRENCY = 4
+MANIFEST_PATH = os.path.join(CHROMA_PATH, "manifest.json")
+CHUNK_INDEX_PATH = os.path.join(CHROMA_PATH, CHUNK_INDEX_FILE)
+DEDUP_INDEX_PATH = os.path.join(CHROMA_PATH, "dedup_index.npz")
+LEXICAL_INDEX_PATH = os.path.join(CHROMA_PATH, LEXICAL_INDEX_FILE)
+NEAR_DUPLICATE_THRESHOLD = 0.8
+dedup_index = DedupIndex(threshold=NEAR_DUPLICATE_THRESHOLD)
 
 def walk_through_files(path, file_extension='.txt'):
     for (dir_path, dir_names, filenames) in os.walk(path):
@@ -17,27 +33,29 @@ def walk_through_files(path, file_extension='.txt'):
             if filename.endswith(file_extension):
                 yield os.path.join(dir_path, filename)
 
-def load_documents():
-    documents = []
+def iter_documents(paths=None):
     counter = 1
-    for f_name in walk_through_files(DATA_PATH):
+    if paths is None:
+        paths = walk_through_files(DATA_PATH)
+    for f_name in paths:
         try:
             with open(f_name, "r", encoding="utf-8") as infile:
                 first_line = infile.readline().strip()
                 if first_line.startswith("URL: "):
                     url = first_line[5:].strip()  
                     content = infile.read() 
-                    metadata = {"url": url} 
-                    document = Document(page_content=content, metadata=metadata) 
-                    documents.append(document)
+                    metadata = {"url": url, "source": f_name}
                     print(f"{counter}).{url}")
                     counter += 1
+                    yield Document(page_content=content, metadata=metadata)
                 else:
                     print(f"Файл {f_name} не содержит URL в первой строке. Пропускаем.")
         except Exception as e:
             print(f"Ошибка при обработке файла {f_name}: {e}")
     print("Конец выполнения функции сбора документов")
-    return documents
+
+def load_documents(paths=None):
+    return list(iter_documents(paths))
 
 def hash_text(text):
     hash_object = hashlib.sha256(text.encode())
@@ -48,9 +66,7 @@ def is_markdown(text):
         return True
     return False
 
-def split_text(documents: list[Document]):
-    chunks = []
-    chunk_id_counter = 0
+def iter_chunks(documents):
     for document in documents:
         if is_markdown(document.page_content):
             text_splitter = MarkdownTextSplitter(
@@ -58,7 +74,6 @@ def split_text(documents: list[Document]):
                 chunk_overlap=100,
                 length_function=len
             )
-            doc_chunks = text_splitter.split_documents([document])
             print("Создание чанков на маркдаунах - MarkdownTextSplitter")
         else:
             text_splitter = RecursiveCharacterTextSplitter(
@@ -66,57 +81,232 @@ def split_text(documents: list[Document]):
                 chunk_overlap=100,
                 length_function=len,
             )
-            doc_chunks = text_splitter.split_documents([document])
             print("Создание чанков - RecursiveCharacterTextSplitter")
-        chunks.extend(doc_chunks)
-    print(f"Разделено {len(documents)} документов на {len(chunks)} блоков.")
-    unique_chunks = []
+        yield from text_splitter.split_documents([document])
+
+def iter_unique_chunks(chunks, start_id=0):
+    chunk_id_counter = start_id
     for chunk in chunks:
         chunk_hash = hash_text(chunk.page_content)
-        if chunk_hash not in global_unique_hashes:
+        if dedup_index.find_duplicate(chunk_hash, chunk.page_content) is None:
             chunk.metadata["chunk_id"] = str(chunk_id_counter)
-            unique_chunks.append(chunk)
-            global_unique_hashes.add(chunk_hash)
+            dedup_index.add(chunk_hash, chunk.page_content)
             chunk_id_counter += 1
-            print(f"Чанк номер: {chunk_id_counter}.")
+            print(f"Чанк номер: {chunk_id_counter - start_id}.")
+            yield chunk
+
+def split_text(documents: list[Document], start_id=0):
+    unique_chunks = list(iter_unique_chunks(iter_chunks(documents), start_id))
     print(f"Всего уникальных чанков: {len(unique_chunks)}.")
     return unique_chunks
 
-def save_to_chroma(chunks: list[Document]):
+def batched(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def embed_batches(embedding_model, batches, concurrency=EMBED_CONCURRENCY):
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        in_flight = deque()
+        for batch in batches:
+            texts = [chunk.page_content for chunk in batch]
+            in_flight.append((batch, executor.submit(embedding_model.embed_documents, texts)))
+            if len(in_flight) >= concurrency:
+                done_batch, future = in_flight.popleft()
+                yield done_batch, future.result()
+        while in_flight:
+            done_batch, future = in_flight.popleft()
+            yield done_batch, future.result()
+
+def hash_file(path):
+    with open(path, "r", encoding="utf-8") as infile:
+        return hash_text(infile.read())
+
+def scan_files():
+    file_hashes = {}
+    for f_name in walk_through_files(DATA_PATH):
+        try:
+            file_hashes[f_name] = hash_file(f_name)
+        except Exception as e:
+            print(f"Ошибка при чтении файла {f_name}: {e}")
+    return file_hashes
+
+def load_manifest():
+    if os.path.exists(MANIFEST_PATH):
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as infile:
+            return json.load(infile)
+    return {"next_chunk_id": 0, "files": {}}
+
+def save_manifest(manifest):
+    tmp_path = MANIFEST_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as outfile:
+        json.dump(manifest, outfile, ensure_ascii=False)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+def get_collection():
+    client = chromadb.PersistentClient(path=CHROMA_PATH)
+    return client.get_or_create_collection(COLLECTION_NAME)
+
+def remove_from_chroma(ids):
+    collection = get_collection()
+    for batch in batched(ids, EMBED_BATCH_SIZE):
+        collection.delete(ids=batch)
+    print(f"Удалено {len(ids)} устаревших чанков из '{CHROMA_PATH}'.")
+
+def update_chroma_metadata(updates):
+    collection = get_collection()
+    for batch in batched(updates, EMBED_BATCH_SIZE):
+        collection.update(ids=[chunk_hash for chunk_hash, _ in batch], metadatas=[metadata for _, metadata in batch])
+    print(f"Перенумеровано {len(updates)} сохранённых чанков без повторного эмбеддинга.")
+
+def load_owned_chunks(paths, known_files):
+    paths = set(paths)
+    hashes = [chunk_hash for path in paths for chunk_hash in known_files.get(path, {}).get("chunks", [])]
+    owned = {}
+    collection = get_collection()
+    for batch in batched(hashes, EMBED_BATCH_SIZE):
+        results = collection.get(ids=batch, include=["documents", "metadatas"])
+        for chunk_hash, text, metadata in zip(results["ids"], results["documents"], results["metadatas"]):
+            if metadata.get("source") in paths:
+                owned[chunk_hash] = (metadata["source"], text)
+    return owned
+
+def load_dedup_index(known_files):
+    index = DedupIndex(threshold=NEAR_DUPLICATE_THRESHOLD)
+    if os.path.exists(DEDUP_INDEX_PATH) and index.load(DEDUP_INDEX_PATH):
+        return index
+    print("Индекс дубликатов не найден, строим по коллекции")
+    results = get_collection().get(include=["documents"])
+    for chunk_hash, text in zip(results["ids"], results["documents"]):
+        index.add(chunk_hash, text)
+    known_hashes = {chunk_hash for entry in known_files.values() for chunk_hash in entry["chunks"]}
+    for chunk_hash in list(index.signatures):
+        if chunk_hash not in known_hashes:
+            index.remove(chunk_hash)
+    return index
+
+def write_search_indexes():
+    results = get_collection().get(include=["documents", "metadatas"])
+    lexical_index = build_lexical_index(
+        [metadata.get("chunk_id") for metadata in results["metadatas"]], results["documents"]
+    )
+    save_lexical_index(lexical_index, LEXICAL_INDEX_PATH)
+    print(f"Индекс BM25 сохранен в '{LEXICAL_INDEX_PATH}' ({len(lexical_index['postings'])} термов).")
+    index = build_chunk_index(results["documents"], results["metadatas"])
+    save_chunk_index(index, CHUNK_INDEX_PATH)
+    print(f"Индекс соседних чанков сохранен в '{CHUNK_INDEX_PATH}' ({len(index)} чанков).")
+
+def save_to_chroma(chunks, batch_size=EMBED_BATCH_SIZE, concurrency=EMBED_CONCURRENCY, reset=True):
     try:
-        if os.path.exists(CHROMA_PATH):
+        if reset and os.path.exists(CHROMA_PATH):
             shutil.rmtree(CHROMA_PATH)
         embedding_model = OllamaEmbeddings(model="mxbai-embed-large")
-        db = Chroma(
-            persist_directory=CHROMA_PATH,
-            embedding_function=embedding_model
-        )
-        for i, chunk in enumerate(chunks, 1):
+        collection = get_collection()
+        saved = 0
+        started = time.perf_counter()
+        for batch, embeddings in embed_batches(embedding_model, batched(chunks, batch_size), concurrency):
             try:
-                print(
-                    f"\n▫ Чанк {i}/{len(chunks)}\n"
-                    f"   Содержимое: {chunk.page_content[:50]}...\n"
-                    f"   Метаданные: {chunk.metadata}\n"
-                    f"   Размер: {len(chunk.page_content)} символов"
-                )
-                db.add_texts(
-                    texts=[chunk.page_content],
-                    metadatas=[chunk.metadata]
+                collection.add(
+                    ids=[hash_text(chunk.page_content) for chunk in batch],
+                    embeddings=embeddings,
+                    documents=[chunk.page_content for chunk in batch],
+                    metadatas=[chunk.metadata for chunk in batch]
                 )
             except Exception as e:
-                print(f"❌ Ошибка добавления чанка {i}: {str(e)}")
+                print(f"❌ Ошибка добавления пакета чанков {saved + 1}-{saved + len(batch)}: {str(e)}")
                 raise
-        print(f"Сохранено {len(chunks)} чанков в '{CHROMA_PATH}'.")
+            saved += len(batch)
+            elapsed = time.perf_counter() - started
+            print(f"▫ Чанки {saved}, {saved / elapsed:.1f} чанков/сек")
+        elapsed = time.perf_counter() - started
+        print(f"Сохранено {saved} чанков в '{CHROMA_PATH}' за {elapsed:.1f} сек "
+              f"({saved / elapsed if elapsed else 0:.1f} чанков/сек, пакет {batch_size}, потоков {concurrency}).")
     except Exception as e:
         print(f"\n💥 Критическая ошибка: {str(e)}")
         raise
     finally:
         print("🏁 Процесс завершен")
 
-def generate_data_store():
-    documents = load_documents()
-    chunks = split_text(documents)
-    save_to_chroma(chunks)
+def generate_data_store(full_rebuild=False):
+    global dedup_index
+    if full_rebuild or not os.path.exists(CHROMA_PATH) or not os.path.exists(MANIFEST_PATH):
+        full_rebuild = True
+        manifest = {"next_chunk_id": 0, "files": {}}
+        dedup_index = DedupIndex(threshold=NEAR_DUPLICATE_THRESHOLD)
+    else:
+        manifest = load_manifest()
+        dedup_index = load_dedup_index(manifest["files"])
+    file_hashes = scan_files()
+    known_files = manifest["files"]
+    changed = [path for path, file_hash in file_hashes.items()
+               if known_files.get(path, {}).get("hash") != file_hash]
+    removed = [path for path in known_files if path not in file_hashes or path in changed]
+    print(f"Файлов: {len(file_hashes)}, новых или изменённых: {len(changed)}, "
+          f"удалённых или устаревших: {len(removed)}.")
+    if not changed and not removed and not full_rebuild:
+        print("Изменений нет, база актуальна.")
+        if not os.path.exists(CHUNK_INDEX_PATH) or not os.path.exists(LEXICAL_INDEX_PATH):
+            write_search_indexes()
+        return
+    candidates = {chunk_hash for path in removed for chunk_hash in known_files[path]["chunks"]}
+    owned = {} if full_rebuild else load_owned_chunks(changed, known_files)
+    for chunk_hash in owned:
+        dedup_index.remove(chunk_hash)
+    for path in removed:
+        del known_files[path]
+    for path in changed:
+        known_files[path] = {"hash": file_hashes[path], "chunks": []}
+    kept = set()
+    updates = []
+
+    def reference_chunk(chunk, chunk_hash):
+        hashes = known_files[chunk.metadata["source"]]["chunks"]
+        if chunk_hash not in hashes:
+            hashes.append(chunk_hash)
+
+    def assign_chunk_id(chunk, chunk_hash):
+        chunk.metadata["chunk_id"] = str(manifest["next_chunk_id"])
+        manifest["next_chunk_id"] += 1
+        dedup_index.add(chunk_hash, chunk.page_content)
+        reference_chunk(chunk, chunk_hash)
+
+    def iter_new_chunks(chunks):
+        for chunk in chunks:
+            chunk_hash = hash_text(chunk.page_content)
+            if chunk_hash not in kept and owned.get(chunk_hash, (None,))[0] == chunk.metadata["source"]:
+                assign_chunk_id(chunk, chunk_hash)
+                kept.add(chunk_hash)
+                updates.append((chunk_hash, chunk.metadata))
+                continue
+            duplicate = dedup_index.find_duplicate(chunk_hash, chunk.page_content)
+            if duplicate is not None:
+                reference_chunk(chunk, duplicate)
+                continue
+            assign_chunk_id(chunk, chunk_hash)
+            print(f"Новый чанк: {chunk.metadata['chunk_id']}.")
+            yield chunk
+
+    save_to_chroma(iter_new_chunks(iter_chunks(iter_documents(changed))), reset=full_rebuild)
+    if updates:
+        update_chroma_metadata(updates)
+    referenced = {chunk_hash for entry in known_files.values() for chunk_hash in entry["chunks"]}
+    stale_ids = candidates - referenced
+    if stale_ids and not full_rebuild:
+        remove_from_chroma(sorted(stale_ids))
+    for chunk_hash in stale_ids:
+        dedup_index.remove(chunk_hash)
+    for chunk_hash, (_, text) in owned.items():
+        if chunk_hash not in stale_ids and chunk_hash not in dedup_index:
+            dedup_index.add(chunk_hash, text)
+    save_manifest(manifest)
+    dedup_index.save(DEDUP_INDEX_PATH)
+    print(f"Индекс дубликатов: {len(dedup_index)} чанков, отброшено близких дубликатов: {dedup_index.near_duplicates}.")
+    write_search_indexes()
 
 if __name__ == "__main__":
-    generate_data_store()
\ No newline at end of file
+    generate_data_store(full_rebuild="--full" in sys.argv)
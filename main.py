@@ -1,7 +1,21 @@
 from fastapi.middleware.cors import CORSMiddleware
 from models.index import ChatMessage
-from providers.ollama import query_rag, reset_context
+from providers.ollama import (
+    query_rag,
+    reset_context,
+    stream_rag,
+    init_provider,
+    warm_up_provider,
+    is_provider_ready,
+    STATE_BACKEND,
+    STATE_DB_PATH,
+    SESSION_BACKEND,
+)
+from dispatcher import UpdateDispatcher, create_chat_lease, create_update_deduplicator
+from storage.shared import process_lock
+from metrics import Counter, Gauge, render_metrics, span
 from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
 from telegram import Update, Bot
 from telegram.ext import (
     ApplicationBuilder,
@@ -10,27 +24,77 @@ from telegram.ext import (
     filters,
     ContextTypes,
 )
+import logging
 import os
 from contextlib import asynccontextmanager
 import asyncio
 
 TELEGRAM_BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
+TELEGRAM_API_URL = os.environ.get("TELEGRAM_API_URL")
 WEBHOOK_PATH = "/telegram_webhook"
 APP_URL = os.environ.get("APP_URL")
+STREAM_ANSWERS = os.environ.get("STREAM_ANSWERS", "1") == "1"
+STREAM_EDIT_INTERVAL = float(os.environ.get("STREAM_EDIT_INTERVAL", "1.0"))
+TELEGRAM_MESSAGE_LIMIT = 4096
+UPDATE_WORKERS = int(os.environ.get("UPDATE_WORKERS", "8"))
+UPDATE_QUEUE_SIZE = int(os.environ.get("UPDATE_QUEUE_SIZE", "100"))
+UPDATE_DEDUP_WINDOW = int(os.environ.get("UPDATE_DEDUP_WINDOW", "600"))
+WEBHOOK_LOCK_PATH = os.environ.get("WEBHOOK_LOCK_PATH", "./webhook.lock")
+CHAT_LEASE_TTL = int(os.environ.get("CHAT_LEASE_TTL", "300"))
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", "1"))
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
+if WEB_CONCURRENCY > 1 and STATE_BACKEND == "memory":
+    raise ValueError("Several workers need STATE_BACKEND=sqlite")
+if STATE_BACKEND != "memory" and SESSION_BACKEND == "memory":
+    raise ValueError("SESSION_BACKEND=memory cannot be shared between workers, use SESSION_BACKEND=sqlite")
 Application = None
+Dispatcher = None
+ChatLease = create_chat_lease(STATE_BACKEND, STATE_DB_PATH, CHAT_LEASE_TTL)
+Deduplicator = create_update_deduplicator(STATE_BACKEND, STATE_DB_PATH, UPDATE_DEDUP_WINDOW)
+UPDATES = Counter("telegram_updates_total", "Webhook updates by outcome", labels=("outcome",))
+Gauge(
+    "telegram_update_queue_depth", "Updates accepted but not yet processed",
+    function=lambda: Dispatcher.pending_count if Dispatcher else 0
+)
+Counter(
+    "telegram_duplicate_llm_calls_saved_total", "Repeated questions dropped before reaching the model",
+    function=lambda: Deduplicator.saved_llm_calls
+)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global Application
-    Application = ApplicationBuilder().token(TELEGRAM_BOT_TOKEN).build()
+    global Application, Dispatcher
+    init_provider()
+    warm_up_task = asyncio.create_task(warm_up_provider())
+    builder = ApplicationBuilder().token(TELEGRAM_BOT_TOKEN)
+    if TELEGRAM_API_URL:
+        builder = builder.base_url(TELEGRAM_API_URL)
+    Application = builder.build()
     await Application.initialize()
     Application.add_handler(CommandHandler("start", start))
     Application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     Application.add_handler(CommandHandler("reset", reset))
-    bot = Bot(TELEGRAM_BOT_TOKEN)
-    await Application.bot.set_webhook(url=f"{APP_URL}{WEBHOOK_PATH}")
+    await register_webhook(Application.bot)
+    Dispatcher = UpdateDispatcher(
+        Application.process_update, workers=UPDATE_WORKERS, max_pending=UPDATE_QUEUE_SIZE, lease=ChatLease
+    )
+    Dispatcher.start()
     yield
-    print("Shutting down...")
+    logger.info("Shutting down...")
+    warm_up_task.cancel()
+    await Dispatcher.stop()
+
+async def register_webhook(bot: Bot):
+    webhook_url = f"{APP_URL}{WEBHOOK_PATH}"
+    with process_lock(WEBHOOK_LOCK_PATH):
+        webhook_info = await bot.get_webhook_info()
+        if webhook_info.url == webhook_url:
+            logger.info("Webhook already set to %s", webhook_url)
+            return
+        await bot.set_webhook(url=webhook_url)
+        logger.info("Webhook set to %s", webhook_url)
 
 app = FastAPI(lifespan=lifespan)
 
@@ -46,31 +110,70 @@ async def reset(update: Update, context: ContextTypes.DEFAULT_TYPE):
         response_text = await reset_context(chat_id)
         await context.bot.send_message(chat_id=update.effective_chat.id, text=response_text)
     except Exception as e:
-        print(f"Error during reset_context processing: {e}")
+        logger.error("Error during reset_context processing: %s", e)
         await context.bot.send_message(
             chat_id=update.effective_chat.id,
             text="Произошла ошибка при обработке вашего запроса.",
         )
 
+def split_message(text):
+    return [text[i:i + TELEGRAM_MESSAGE_LIMIT] for i in range(0, len(text), TELEGRAM_MESSAGE_LIMIT)]
+
+async def stream_answer(message: ChatMessage, chat_id: str, processing_message, context: ContextTypes.DEFAULT_TYPE):
+    loop = asyncio.get_running_loop()
+    response_text = ""
+    shown_text = ""
+    last_edit = loop.time()
+    async for piece in stream_rag(message, chat_id):
+        response_text += piece
+        now = loop.time()
+        if now - last_edit < STREAM_EDIT_INTERVAL or not response_text.strip():
+            continue
+        preview = split_message(response_text)[0]
+        if preview == shown_text:
+            continue
+        last_edit = now
+        try:
+            with span("telegram_send"):
+                await processing_message.edit_text(preview)
+            shown_text = preview
+        except Exception as e:
+            logger.warning("Error editing message: %s", e)
+    parts = split_message(response_text) if response_text.strip() else ["По данному вопросу ничего не найдено"]
+    with span("telegram_send"):
+        if parts[0] != shown_text:
+            await processing_message.edit_text(parts[0])
+        for part in parts[1:]:
+            await context.bot.send_message(chat_id=processing_message.chat_id, text=part)
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    with span("handle_message"):
+        await answer_message(update, context)
+
+async def answer_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = str(update.effective_chat.id)
     question_text = update.message.text
     if question_text:
         message = ChatMessage(question=question_text)
         try:
-            processing_message = await context.bot.send_message(
-                chat_id=update.effective_chat.id, 
-                text="Обрабатываю ваш вопрос, это может занять некоторое время..."
-            )
+            with span("telegram_send"):
+                processing_message = await context.bot.send_message(
+                    chat_id=update.effective_chat.id, 
+                    text="Обрабатываю ваш вопрос, это может занять некоторое время..."
+                )
+            if STREAM_ANSWERS:
+                await stream_answer(message, chat_id, processing_message, context)
+                return
             processing_message_id = processing_message.message_id
             response_text = await query_rag(message, chat_id)
-            try:
-                await context.bot.delete_message(chat_id=update.effective_chat.id, message_id=processing_message_id)
-            except Exception as e:
-                 print(f"Error deleting message: {e}")
-            await context.bot.send_message(chat_id=update.effective_chat.id, text=response_text)
+            with span("telegram_send"):
+                try:
+                    await context.bot.delete_message(chat_id=update.effective_chat.id, message_id=processing_message_id)
+                except Exception as e:
+                    logger.warning("Error deleting message: %s", e)
+                await context.bot.send_message(chat_id=update.effective_chat.id, text=response_text)
         except Exception as e:
-            print(f"Error during query_rag processing: {e}")
+            logger.error("Error during query_rag processing: %s", e)
             await context.bot.send_message(
                 chat_id=update.effective_chat.id,
                 text="Произошла ошибка при обработке вашего запроса.",
@@ -78,6 +181,15 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         await context.bot.send_message(chat_id=update.effective_chat.id, text="Я не понял ваш вопрос.")
 
+async def reply_busy(update: Update):
+    try:
+        await Application.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text="Сейчас очень много вопросов, пожалуйста, попробуйте чуть позже.",
+        )
+    except Exception as e:
+        logger.warning("Error sending busy reply: %s", e)
+
 @app.post(WEBHOOK_PATH)
 async def telegram_webhook(request: Request):
     try:
@@ -85,12 +197,36 @@ async def telegram_webhook(request: Request):
         if Application is None:
             raise ValueError("Application not initialized.  Check startup event.")
         update = Update.de_json(data, Application.bot)
-        asyncio.create_task(Application.process_update(update))
+        if await Deduplicator.check(update):
+            UPDATES.inc("duplicate")
+            logger.debug("Dropping repeated update %s", update.update_id)
+            return {"ok": True}
+        if not Dispatcher.submit(update):
+            UPDATES.inc("rejected")
+            logger.warning("Update queue is full, rejecting update %s", update.update_id)
+            if update.effective_chat:
+                asyncio.create_task(reply_busy(update))
+        else:
+            UPDATES.inc("accepted")
         return {"ok": True}
     except Exception as e:
-        print(f"Error processing Telegram webhook: {e}")
+        logger.error("Error processing Telegram webhook: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
     
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    if not is_provider_ready():
+        return JSONResponse(status_code=503, content={"status": "warming up"})
+    return {"status": "ready"}
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 async def read_root():
     return {"Hello": "I'm your telegram bot's backend!"}
@@ -0,0 +1,50 @@
+import math
+import os
+from langchain_core.documents.base import Document
+
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "1500"))
+CHARS_PER_TOKEN = float(os.environ.get("CHARS_PER_TOKEN", "3.0"))
+
+def count_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def assemble_context(ranked_docs, chunk_index, budget=CONTEXT_TOKEN_BUDGET):
+    selected = {}
+    texts = {}
+    used = 0
+
+    def take(url, chunk_id, text):
+        nonlocal used
+        cost = count_tokens(text)
+        if used + cost > budget:
+            return False
+        selected.setdefault(url, set()).add(chunk_id)
+        texts[chunk_id] = text
+        used += cost
+        return True
+
+    hits = []
+    for doc in ranked_docs:
+        chunk_id = doc.metadata.get("chunk_id")
+        url = doc.metadata.get("url")
+        if chunk_id is None or not url:
+            continue
+        hits.append((url, str(chunk_id), doc.page_content))
+    for url, chunk_id, text in hits:
+        if chunk_id in texts:
+            continue
+        if not take(url, chunk_id, text) and not texts:
+            trimmed = text[:int((budget - used) * CHARS_PER_TOKEN)]
+            take(url, chunk_id, trimmed)
+    for url, chunk_id, text in hits:
+        if chunk_id not in texts:
+            continue
+        for neighbor_id in chunk_index.window(chunk_id):
+            entry = chunk_index.get(neighbor_id)
+            if neighbor_id not in texts and entry and entry["url"] == url:
+                take(url, neighbor_id, entry["text"])
+    documents = []
+    for url, chunk_ids in selected.items():
+        content = "\n".join(texts[chunk_id] for chunk_id in sorted(chunk_ids, key=int))
+        documents.append(Document(page_content=content, metadata={"url": url}))
+    return documents, used
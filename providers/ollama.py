@@ -1,17 +1,122 @@
 from langchain_chroma import Chroma
+from chromadb.config import Settings
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from langchain_ollama import OllamaEmbeddings, OllamaLLM
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from models.index import ChatMessage
 from langchain_core.documents.base import Document
+from storage.chunk_index import CHUNK_INDEX_FILE, ChunkIndex
+from storage.answer_cache import create_answer_cache
+from storage.lexical_index import LEXICAL_INDEX_FILE, LexicalIndex
+from providers.context import assemble_context, count_tokens
+from storage.session_store import create_session_store
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from ollama import AsyncClient
+from metrics import Counter, Gauge, Histogram, STAGE_SECONDS, span
+import asyncio
+import logging
+import threading
+import time
+import os
 
-CHROMA_PATH = "./db_metadata_v5"
+CHROMA_PATH = os.environ.get("CHROMA_PATH", "./db_metadata_v5")
+RETRIEVAL_K = 3
+VECTOR_K = int(os.environ.get("VECTOR_K", "6"))
+LEXICAL_K = int(os.environ.get("LEXICAL_K", "6"))
+RRF_K = 60
+EMBEDDING_CACHE_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE", "1024"))
+RETRIEVAL_WORKERS = int(os.environ.get("RETRIEVAL_WORKERS", "4"))
+MAX_CONCURRENT_GENERATIONS = int(os.environ.get("MAX_CONCURRENT_GENERATIONS", "2"))
+ANSWER_CACHE_SIZE = int(os.environ.get("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = int(os.environ.get("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("ANSWER_CACHE_THRESHOLD", "0.95"))
+STATE_BACKEND = os.environ.get("STATE_BACKEND", "memory")
+STATE_DB_PATH = os.environ.get("STATE_DB_PATH", "./state.db")
+SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "sqlite")
+SESSION_DB_PATH = os.environ.get("SESSION_DB_PATH", "./sessions.db")
+SESSION_MAX_MESSAGES = int(os.environ.get("SESSION_MAX_MESSAGES", "20"))
+SESSION_IDLE_TTL = int(os.environ.get("SESSION_IDLE_TTL", "604800"))
+HISTORY_MODE = os.environ.get("HISTORY_MODE", "summary")
+HISTORY_KEEP_TURNS = int(os.environ.get("HISTORY_KEEP_TURNS", "3"))
+HISTORY_SUMMARY_TURNS = int(os.environ.get("HISTORY_SUMMARY_TURNS", "2"))
+LLM_MODEL = "owl/t-lite"
+EMBEDDING_MODEL = "mxbai-embed-large"
+MODEL_KEEP_ALIVE = int(os.environ.get("MODEL_KEEP_ALIVE", "-1"))
+WARM_UP_RETRY_INTERVAL = float(os.environ.get("WARM_UP_RETRY_INTERVAL", "5"))
 
-model = OllamaLLM(model="owl/t-lite", temperature=0.1)
-embedding_function = OllamaEmbeddings(model="mxbai-embed-large")
-db = Chroma(persist_directory=CHROMA_PATH, embedding_function=embedding_function)
-chat_history = {}
+model = None
+embedding_function = None
+db = None
+chunk_index = None
+lexical_index = None
+document_chain = None
+summary_chain = None
+provider_ready = False
+logger = logging.getLogger(__name__)
+session_store = create_session_store(SESSION_BACKEND, SESSION_DB_PATH, SESSION_MAX_MESSAGES, SESSION_IDLE_TTL)
+retrieval_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
+generation_semaphore = asyncio.Semaphore(MAX_CONCURRENT_GENERATIONS)
+summary_tasks = {}
+refresh_lock = threading.Lock()
+answer_cache = create_answer_cache(
+    STATE_BACKEND, STATE_DB_PATH, ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_THRESHOLD
+)
+
+ANSWER_CACHE_REQUESTS = Counter("answer_cache_requests_total", "Answer cache lookups", labels=("result",))
+PROMPT_TOKENS = Histogram(
+    "rag_prompt_tokens", "Estimated prompt size per request, tokens",
+    buckets=(256, 512, 1024, 1536, 2048, 3072, 4096, 6144, 8192)
+)
+GENERATIONS_IN_FLIGHT = Gauge("llm_generations_in_flight", "LLM generations currently running")
+GENERATIONS_WAITING = Gauge("llm_generations_waiting", "LLM generations waiting for a free slot")
+Counter(
+    "embedding_cache_hits_total", "Question embeddings served from cache",
+    function=lambda: embed_normalized_question.cache_info().hits
+)
+Counter(
+    "embedding_cache_misses_total", "Question embeddings computed by the model",
+    function=lambda: embed_normalized_question.cache_info().misses
+)
+
+def load_chunks_from_db():
+    results = db.get(include=["documents", "metadatas"])
+    return results["documents"], results["metadatas"]
+
+def load_chunks_from_index():
+    return list(chunk_index.entries), [entry["text"] for entry in chunk_index.entries.values()]
+
+def normalize_question(question):
+    return " ".join(question.lower().split())
+
+@lru_cache(maxsize=EMBEDDING_CACHE_SIZE)
+def embed_normalized_question(normalized_question):
+    return tuple(embedding_function.embed_query(normalized_question))
+
+def embed_question(question):
+    return list(embed_normalized_question(normalize_question(question)))
+
+def refresh_store():
+    with refresh_lock:
+        if chunk_index.refresh():
+            lexical_index.refresh()
+            answer_cache.invalidate(chunk_index.mtime)
+            logger.info("Индексы чанков загружены, устаревшие ответы удалены из кэша")
+
+def find_cached_answer(question):
+    refresh_store()
+    with span("embedding"):
+        embedding = embed_question(question)
+    with span("answer_cache"):
+        cached = answer_cache.lookup(embedding)
+    ANSWER_CACHE_REQUESTS.inc("hit" if cached else "miss")
+    logger.debug("Кэш ответов: %s", answer_cache.stats())
+    return cached
+
+def cache_answer(question, response_text, links):
+    answer_cache.store(normalize_question(question), embed_question(question), response_text, links)
 
 prompt_template = ChatPromptTemplate.from_messages(
     [
@@ -38,108 +143,247 @@ prompt_template = ChatPromptTemplate.from_messages(
     ]
 )
 
-document_chain = create_stuff_documents_chain(llm=model, prompt=prompt_template)
+SYSTEM_PROMPT_TOKENS = count_tokens(prompt_template.messages[0].prompt.template)
 
-async def query_rag(message: ChatMessage, session_id: str = "") -> str:
-    if session_id not in chat_history:
-        chat_history[session_id] = []
-    print(f"Вопрос пользователя: {message.question}")
-
-    def get_chunk_id(chunk_id, base_url):
-        results = db.get(
-            where={"chunk_id": chunk_id},
-            include=["documents", "metadatas"]
+summary_prompt = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            """
+                [INST]Ты ведёшь краткий конспект диалога абитуриента с консультантом АлтГУ.
+                Дополни текущий конспект новыми репликами. Сохрани вопросы абитуриента, названия направлений,
+                сроки, баллы и другие факты из ответов. Пиши кратко, на русском языке, без разметки.
+                [/INST]
+            """
+        ),
+        ("human", "Текущий конспект: {summary}\n\nНовые реплики:\n{dialog}")
+    ]
+)
+
+def init_provider():
+    global model, embedding_function, db, chunk_index, lexical_index, document_chain, summary_chain
+    if model is not None:
+        return
+    model = OllamaLLM(model=LLM_MODEL, temperature=0.1, keep_alive=MODEL_KEEP_ALIVE)
+    embedding_function = OllamaEmbeddings(model=EMBEDDING_MODEL, keep_alive=MODEL_KEEP_ALIVE)
+    db = Chroma(
+        persist_directory=CHROMA_PATH,
+        embedding_function=embedding_function,
+        client_settings=Settings(anonymized_telemetry=False, allow_reset=False)
+    )
+    chunk_index = ChunkIndex(os.path.join(CHROMA_PATH, CHUNK_INDEX_FILE), fallback_loader=load_chunks_from_db)
+    lexical_index = LexicalIndex(os.path.join(CHROMA_PATH, LEXICAL_INDEX_FILE), fallback_loader=load_chunks_from_index)
+    document_chain = create_stuff_documents_chain(llm=model, prompt=prompt_template)
+    summary_chain = summary_prompt | model
+    refresh_store()
+
+async def warm_up_provider():
+    global provider_ready
+    loop = asyncio.get_running_loop()
+    client = AsyncClient()
+    while not provider_ready:
+        try:
+            await client.generate(model=LLM_MODEL, prompt="", keep_alive=MODEL_KEEP_ALIVE)
+            await loop.run_in_executor(retrieval_executor, retrieve_context, "прогрев")
+            provider_ready = True
+            logger.info("Модели загружены и прогреты")
+        except Exception as e:
+            logger.warning("Ошибка при прогреве моделей: %s", e)
+            await asyncio.sleep(WARM_UP_RETRY_INTERVAL)
+
+def is_provider_ready():
+    return provider_ready
+
+def load_history(session_id):
+    chat_history = session_store.get_messages(session_id)
+    summary = session_store.get_summary(session_id)
+    if summary:
+        chat_history.insert(0, SystemMessage(content=f"Краткое содержание предыдущего диалога: {summary}"))
+    return chat_history
+
+def format_dialog(messages):
+    lines = []
+    for item in messages:
+        role = "Абитуриент" if isinstance(item, HumanMessage) else "Консультант"
+        lines.append(f"{role}: {item.content}")
+    return "\n".join(lines)
+
+async def summarize_history(session_id):
+    loop = asyncio.get_running_loop()
+    try:
+        messages = await loop.run_in_executor(retrieval_executor, session_store.get_messages, session_id)
+        keep = HISTORY_KEEP_TURNS * 2
+        if len(messages) < keep + HISTORY_SUMMARY_TURNS * 2:
+            return
+        folded = messages[:len(messages) - keep]
+        previous = await loop.run_in_executor(retrieval_executor, session_store.get_summary, session_id)
+        async with generation_slot():
+            with span("history_summary"):
+                summary = await summary_chain.ainvoke({
+                    "summary": previous or "пока пуст",
+                    "dialog": format_dialog(folded)
+                })
+        folded_now = await loop.run_in_executor(
+            retrieval_executor, session_store.fold_messages, session_id, len(folded), summary.strip(), previous
         )
-        print(results)
-        if results and results["metadatas"]:
-            if len(results["metadatas"]) > 0:
-                metadata = results["metadatas"][0]
-                if "url" in metadata and metadata["url"] == base_url:
-                    return chunk_id
-                else:
-                    return None
-            else:
-                return None
-        else:
-            return None
-
-    def merge_and_sort_chunk_ids(data):
-        grouped_data = {}
-        for chunk_ids, urls in data:
-            url = urls[0]
-            if url not in grouped_data:
-                grouped_data[url] = []
-            grouped_data[url].extend(chunk_ids)
-        result = []
-        for url, chunk_ids in grouped_data.items():
-            sorted_chunk_ids = sorted(list(set(chunk_ids)), key=lambda x: int(x))
-            result.append([[str(chunk_id) for chunk_id in sorted_chunk_ids], [url]])
-        return result
-
-    def get_chunk_by_id(chunk_ids):
-        contents = []
-        for chunk_id in chunk_ids:
-            results = db.get(
-                where={"chunk_id": chunk_id},
-                include=["documents"]
+        if folded_now:
+            logger.info("История сессии %s сжата: %s сообщений", session_id, len(folded))
+    except Exception as e:
+        logger.error("Ошибка при сжатии истории: %s", e)
+    finally:
+        if summary_tasks.get(session_id) is asyncio.current_task():
+            del summary_tasks[session_id]
+
+def schedule_summary(session_id):
+    if HISTORY_MODE != "summary" or session_id in summary_tasks:
+        return
+    summary_tasks[session_id] = asyncio.create_task(summarize_history(session_id))
+
+def fuse_results(docs_with_score, lexical_results, k=RETRIEVAL_K):
+    fused_scores = {}
+    documents = {}
+    for rank, (doc, score) in enumerate(docs_with_score):
+        chunk_id = doc.metadata.get("chunk_id")
+        fused_scores[chunk_id] = fused_scores.get(chunk_id, 0) + 1 / (RRF_K + rank + 1)
+        documents[chunk_id] = doc
+    for rank, (chunk_id, score) in enumerate(lexical_results):
+        entry = chunk_index.get(chunk_id)
+        if entry is None:
+            continue
+        fused_scores[chunk_id] = fused_scores.get(chunk_id, 0) + 1 / (RRF_K + rank + 1)
+        if chunk_id not in documents:
+            documents[chunk_id] = Document(
+                page_content=entry["text"], metadata={"chunk_id": chunk_id, "url": entry["url"]}
             )
-            if results and results["documents"]:
-                contents.append(results["documents"][0])
-            else:
-                return None
-        combined_content = "\n".join(contents)
-        combined_document = Document(page_content=combined_content, metadata={})
-        return combined_document
-
-    chunk_id_list = []
-    relevant_docs = db.similarity_search(message.question, k=3)
-    for doc in reversed(relevant_docs):
-        doc_chunk_id_list = []
-        doc_url_list = []
-        if "chunk_id" in doc.metadata and "url" in doc.metadata:
-            chunk_id = doc.metadata.get("chunk_id")
-            doc_url = doc.metadata.get("url")
-            if chunk_id and doc_url:
-                prevent_chunk_id = int(chunk_id) - 1
-                valid_prevent_chunk_id = get_chunk_id(str(prevent_chunk_id), doc_url)
-                next_chunk_id = int(chunk_id) + 1
-                valid_next_chunk_id = get_chunk_id(str(next_chunk_id), doc_url)
-                if valid_prevent_chunk_id:
-                    doc_chunk_id_list.append(valid_prevent_chunk_id)
-                doc_chunk_id_list.append(chunk_id)
-                if valid_next_chunk_id:
-                    doc_chunk_id_list.append(valid_next_chunk_id)
-                doc_url_list.append(doc_url)
-        chunk_id_list.append([doc_chunk_id_list, doc_url_list])
-    sorted_chunk_id_list = merge_and_sort_chunk_ids(chunk_id_list)
-    expanded_relevant_docs = []
-    links = []
-    for items in sorted_chunk_id_list:
-        links.append(items[1][0])
-        document_item = get_chunk_by_id(items[0])
-        expanded_relevant_docs.append(document_item)
-    docs_with_score = db.similarity_search_with_score(message.question, k=3)
-    for doc, score in docs_with_score:
-        print(f"Document: {doc.page_content[50:]}, Score: {score}")
-    print(f"Контекст: {relevant_docs}")
-    response_text = document_chain.invoke({
-        "context": relevant_docs,
-        "question": message.question,
-        "chat_history": chat_history[session_id]
-    })
-    chat_history[session_id].append(HumanMessage(content=message.question))
-    chat_history[session_id].append(AIMessage(content=response_text))
-    if links:
-        links_string = "\n".join(links)
-        response_text = response_text + "\n\nПолезные ссылки:\n" + links_string
-    print("Ответ сформирован")
-    return response_text
+    ranked = sorted(fused_scores, key=fused_scores.get, reverse=True)[:k]
+    return [documents[chunk_id] for chunk_id in ranked]
 
-async def reset_context(session_id: str = "") -> str:
-    if session_id in chat_history:
-        chat_history[session_id] = []
-    return "Контекст сброшен!"
+def retrieve_context(question):
+    refresh_store()
+    with span("embedding"):
+        embedding = embed_question(question)
+    with span("vector_search"):
+        docs_with_score = db.similarity_search_by_vector_with_relevance_scores(embedding, k=VECTOR_K)
+    if logger.isEnabledFor(logging.DEBUG):
+        for doc, score in docs_with_score:
+            logger.debug("Document: %s, Score: %s", doc.page_content[50:], score)
+    with span("lexical_search"):
+        lexical_results = lexical_index.search(question, k=LEXICAL_K)
+    logger.debug("BM25: %s", lexical_results)
+    with span("context_assembly"):
+        relevant_docs = fuse_results(docs_with_score, lexical_results)
+        context_docs, context_tokens = assemble_context(relevant_docs, chunk_index)
+    links = [doc.metadata["url"] for doc in context_docs]
+    logger.debug("Контекст: %s", context_docs)
+    return context_docs, links, context_tokens
+
+def log_prompt_size(context_tokens, chat_history, question):
+    history_tokens = sum(count_tokens(message.content) for message in chat_history)
+    total = SYSTEM_PROMPT_TOKENS + context_tokens + history_tokens + count_tokens(question)
+    PROMPT_TOKENS.observe(total)
+    logger.info("Токены промпта: %s (контекст %s, история %s)", total, context_tokens, history_tokens)
 
+@asynccontextmanager
+async def generation_slot():
+    GENERATIONS_WAITING.inc()
+    try:
+        await generation_semaphore.acquire()
+    finally:
+        GENERATIONS_WAITING.dec()
+    GENERATIONS_IN_FLIGHT.inc()
+    try:
+        yield
+    finally:
+        GENERATIONS_IN_FLIGHT.dec()
+        generation_semaphore.release()
 
+def format_links(links):
+    if not links:
+        return ""
+    links_string = "\n".join(links)
+    return "\n\nПолезные ссылки:\n" + links_string
+
+async def query_rag(message: ChatMessage, session_id: str = "") -> str:
+    loop = asyncio.get_running_loop()
+    chat_history = await loop.run_in_executor(retrieval_executor, load_history, session_id)
+    logger.debug("Вопрос пользователя: %s", message.question)
+    use_cache = not chat_history
+    cached = None
+    if use_cache:
+        cached = await loop.run_in_executor(retrieval_executor, find_cached_answer, message.question)
+    if cached:
+        response_text, links = cached
+    else:
+        with span("retrieval"):
+            relevant_docs, links, context_tokens = await loop.run_in_executor(
+                retrieval_executor, retrieve_context, message.question
+            )
+        log_prompt_size(context_tokens, chat_history, message.question)
+        async with generation_slot():
+            with span("llm_generation"):
+                response_text = await document_chain.ainvoke({
+                    "context": relevant_docs,
+                    "question": message.question,
+                    "chat_history": chat_history
+                })
+        if use_cache:
+            await loop.run_in_executor(retrieval_executor, cache_answer, message.question, response_text, links)
+    await loop.run_in_executor(retrieval_executor, session_store.append_messages, session_id, [
+        HumanMessage(content=message.question),
+        AIMessage(content=response_text)
+    ])
+    schedule_summary(session_id)
+    response_text = response_text + format_links(links)
+    logger.debug("Ответ сформирован")
+    return response_text
 
+async def stream_rag(message: ChatMessage, session_id: str = ""):
+    loop = asyncio.get_running_loop()
+    chat_history = await loop.run_in_executor(retrieval_executor, load_history, session_id)
+    logger.debug("Вопрос пользователя: %s", message.question)
+    use_cache = not chat_history
+    cached = None
+    if use_cache:
+        cached = await loop.run_in_executor(retrieval_executor, find_cached_answer, message.question)
+    if cached:
+        response_text, links = cached
+        yield response_text
+    else:
+        with span("retrieval"):
+            relevant_docs, links, context_tokens = await loop.run_in_executor(
+                retrieval_executor, retrieve_context, message.question
+            )
+        log_prompt_size(context_tokens, chat_history, message.question)
+        parts = []
+        async with generation_slot():
+            started = time.perf_counter()
+            async for token in document_chain.astream({
+                "context": relevant_docs,
+                "question": message.question,
+                "chat_history": chat_history
+            }):
+                if not parts:
+                    STAGE_SECONDS.observe(time.perf_counter() - started, "llm_prefill")
+                parts.append(token)
+                yield token
+            STAGE_SECONDS.observe(time.perf_counter() - started, "llm_generation")
+        response_text = "".join(parts)
+        if use_cache:
+            await loop.run_in_executor(retrieval_executor, cache_answer, message.question, response_text, links)
+    await loop.run_in_executor(retrieval_executor, session_store.append_messages, session_id, [
+        HumanMessage(content=message.question),
+        AIMessage(content=response_text)
+    ])
+    links_footer = format_links(links)
+    if links_footer:
+        yield links_footer
+    schedule_summary(session_id)
+    logger.debug("Ответ сформирован")
 
+async def reset_context(session_id: str = "") -> str:
+    task = summary_tasks.pop(session_id, None)
+    if task:
+        task.cancel()
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(retrieval_executor, session_store.reset, session_id)
+    return "Контекст сброшен!"
@@ -1,7 +1,15 @@
 from bs4 import BeautifulSoup
 import requests
-import numpy as np
-import random
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import signal
+from collections import deque
+import threading
+import hashlib
+import json
 import time
 import PyPDF2
 from io import BytesIO
@@ -12,10 +20,176 @@ import re
 import os
 from urllib.parse import urlparse
 
+try:
+    import resource
+except ImportError:
+    resource = None
+
 FILE_TO_PARSE = "data/links.txt"
 DIR_TO_STORE = "docs"
 DIR_TO_CACHE = "cache"
 REPARSING_DATA = False
+try:
+    import lxml
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+CRAWL_WORKERS = 4
+HOST_MIN_INTERVAL = 1.0
+REQUEST_TIMEOUT = 16
+MAX_RETRIES = 3
+RETRY_BACKOFF = 2
+FETCH_CACHE_PATH = os.path.join(DIR_TO_CACHE, "http_cache.json")
+CRAWL_CHECKPOINT_PATH = os.path.join(DIR_TO_CACHE, "frontier.json")
+CHECKPOINT_EVERY = 50
+CONVERT_WORKERS = os.cpu_count() or 2
+CONVERT_TIMEOUT = 300
+CONVERT_MEMORY_LIMIT_MB = 2048
+CONVERT_MAX_PENDING = CONVERT_WORKERS * 4
+
+class HostRateLimiter:
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self.next_allowed = {}
+        self.lock = threading.Lock()
+
+    def wait(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            allowed_at = max(now, self.next_allowed.get(host, now))
+            self.next_allowed[host] = allowed_at + self.min_interval
+        if allowed_at > now:
+            time.sleep(allowed_at - now)
+
+class FetchCache:
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as infile:
+                    self.entries = json.load(infile)
+            except Exception as e:
+                print(f"Не удалось прочитать кэш загрузок {path}: {e}")
+
+    def get(self, url, need_links=False):
+        with self.lock:
+            entry = self.entries.get(url)
+        if entry is None:
+            return None
+        if entry["output"] and not os.path.exists(entry["output"]):
+            return None
+        if need_links and entry["links"] is None:
+            return None
+        return entry
+
+    def conditional_headers(self, url, need_links=False):
+        entry = self.get(url, need_links)
+        headers = {}
+        if entry:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def update(self, url, headers, content_hash, links, output):
+        with self.lock:
+            self.entries[url] = {
+                "etag": headers.get("ETag"),
+                "last_modified": headers.get("Last-Modified"),
+                "sha256": content_hash,
+                "links": links,
+                "output": output if output and os.path.exists(output) else None,
+            }
+
+    def refresh_validators(self, url, headers):
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is not None:
+                entry["etag"] = headers.get("ETag")
+                entry["last_modified"] = headers.get("Last-Modified")
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self.lock:
+            data = json.dumps(self.entries, ensure_ascii=False)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as outfile:
+            outfile.write(data)
+        os.replace(tmp_path, self.path)
+
+class CrawlFrontier:
+    def __init__(self, checkpoint_path, visited=()):
+        self.checkpoint_path = checkpoint_path
+        self.queue = deque()
+        self.visited = set(visited)
+        self.in_progress = set()
+
+    @classmethod
+    def from_checkpoint(cls, checkpoint_path):
+        with open(checkpoint_path, "r", encoding="utf-8") as infile:
+            data = json.load(infile)
+        frontier = cls(checkpoint_path, data["visited"])
+        frontier.queue.extend(data["queue"])
+        return frontier
+
+    def add(self, link, force=False):
+        normalized = transform_link(link)
+        if normalized is None:
+            if not force:
+                return False
+            normalized = link
+        if normalized in self.visited and not force:
+            return False
+        self.visited.add(normalized)
+        self.queue.append(normalized)
+        return True
+
+    def pop(self):
+        link = self.queue.popleft()
+        self.in_progress.add(link)
+        return link
+
+    def done(self, link):
+        self.in_progress.discard(link)
+
+    def __len__(self):
+        return len(self.queue)
+
+    def save(self, pending=()):
+        os.makedirs(os.path.dirname(self.checkpoint_path), exist_ok=True)
+        data = {
+            "queue": sorted(self.in_progress | set(pending)) + list(self.queue),
+            "visited": list(self.visited),
+        }
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as outfile:
+            json.dump(data, outfile, ensure_ascii=False)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def clear_checkpoint(self):
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+def create_session():
+    retry = Retry(
+        total=MAX_RETRIES,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=[429, 500, 502, 503, 504],
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(pool_connections=CRAWL_WORKERS, pool_maxsize=CRAWL_WORKERS, max_retries=retry)
+    http_session = requests.Session()
+    http_session.mount("https://", adapter)
+    http_session.mount("http://", adapter)
+    return http_session
+
+session = create_session()
+rate_limiter = HostRateLimiter(HOST_MIN_INTERVAL)
+fetch_cache = FetchCache(FETCH_CACHE_PATH)
 
 def transform_link(link):
     if link is None:
@@ -43,23 +217,6 @@ def transform_link(link):
     else:
         return None
 
-def extract_urls_from_txt_files(directory):
-    urls = []
-    try:
-        for filename in os.listdir(directory):
-            if filename.endswith(".txt"):
-                filepath = os.path.join(directory, filename)
-                with open(filepath, "r", encoding="utf-8") as infile:
-                    first_line = infile.readline().strip()
-                    if first_line.startswith("URL: "):
-                        url = first_line[5:].strip()
-                        urls.append(url)
-    except FileNotFoundError:
-        print(f"Директория не найдена: {directory}")
-    except Exception as e:
-        print(f"Произошла ошибка: {e}")
-    return urls
-
 def load_links_from_file(filename):
     links = []
     try:
@@ -95,146 +252,115 @@ def extract_filename_from_url(url, domain="abiturient.asu.ru"):
     filename = "asu_" + filename
     return filename
 
+ALIGNMENT_TYPES = {
+    WD_ALIGN_PARAGRAPH.LEFT: 'left',
+    WD_ALIGN_PARAGRAPH.CENTER: 'center',
+    WD_ALIGN_PARAGRAPH.JUSTIFY: 'justify',
+    WD_ALIGN_PARAGRAPH.RIGHT: 'right',
+    None: 'NoneStyle'
+}
+
+def docx_paragraph_line(paragraph):
+    paragraph_text = paragraph.text
+    if not paragraph_text:
+        return None
+    font_sizes = []
+    font_weights = []
+    alignment = ALIGNMENT_TYPES.get(paragraph.alignment, 'NoneStyle')
+    for run in paragraph.runs:
+        font_sizes.append(run.font.size.pt if run.font.size else 0)
+        if run.font.bold:
+            font_weights.append("bold")
+        if run.font.italic:
+            font_weights.append("italic")
+        if run.font.underline:
+            font_weights.append("underline")
+        if not font_weights:
+            font_weights.append("normal")
+    alignment_row = alignment if paragraph.runs else 'mix'
+    return [paragraph_text, min(font_sizes) if font_sizes else 0, alignment_row, font_weights]
+
+def docx_table_lines(table, table_header):
+    rows = table.rows
+    num_rows = len(rows)
+    num_cols = len(table.columns)
+    if num_rows <= 1 or num_cols == 0:
+        return
+    headers = [cell.text for cell in rows[0].cells]
+    first_col = 0 if table_header == "center" else 1
+    if table_header != "center":
+        yield [headers[0], 1, 'mix', 'normal']
+    for i in range(1, num_rows):
+        cells = rows[i].cells
+        if table_header == "center":
+            yield [f"    * {i}", 1, 'mix', 'normal']
+        elif cells:
+            yield [f"    * {cells[0].text}", 1, 'mix', 'normal']
+        else:
+            yield ["    * N/A", 1, 'mix', 'normal']
+        for j in range(first_col, num_cols):
+            yield [f"        * {headers[j] if j < len(headers) else 'N/A'}", 1, 'mix', 'normal']
+            if j < len(cells):
+                table_cell = re.sub(r'\s+', ' ', cells[j].text)
+                yield [f"            * {table_cell}", 1, 'mix', 'normal']
+            else:
+                yield ["            * N/A", 1, 'mix', 'normal']
+
+def read_docx_lines(doc):
+    output_lines = []
+    for element in doc.element.body:
+        if isinstance(element, docx.oxml.text.paragraph.CT_P):
+            line = docx_paragraph_line(docx.text.paragraph.Paragraph(element, doc))
+            if line:
+                output_lines.append(line)
+        elif isinstance(element, docx.oxml.table.CT_Tbl):
+            table_header = output_lines[-1][2] if output_lines else "mix"
+            output_lines.extend(docx_table_lines(docx.table.Table(element, doc), table_header))
+    return output_lines
+
+def is_docx_heading(line, size, alignment="center"):
+    return int(line[1]) == size and line[2] == alignment and 'bold' in line[3]
+
+def mark_docx_headings(output_lines):
+    first = output_lines[0]
+    if "italic" in first[3] or "bold" not in first[3] or "center" not in first[2]:
+        return
+    first[0] = "# " + first[0]
+    h1_config = [first[1], first[2], first[3]]
+    merged = 0
+    for line in output_lines[1:]:
+        if [line[1], line[2], line[3]] != h1_config:
+            break
+        first[0] += f" {line[0]}"
+        merged += 1
+    del output_lines[1:1 + merged]
+    h1_size = int(h1_config[0])
+    h2_config = []
+    for line in output_lines[1:]:
+        if line[0].lstrip().startswith("*"):
+            continue
+        if is_docx_heading(line, 9) and (not h2_config or is_docx_heading(h2_config, 9)):
+            line[0] = "## " + line[0]
+        elif h1_size == 14:
+            for size in (16, 13, 12):
+                if is_docx_heading(line, size) and (not h2_config or is_docx_heading(h2_config, size)):
+                    line[0] = "## " + line[0]
+                    if not h2_config:
+                        h2_config = line[:]
+                    break
+
 def process_docx(docx_filepath, output_filepath, link):
     try:
         doc = docx.Document(docx_filepath)
-        output_lines = []
-        element_index = 0
-        for element in doc.element.body:
-            if isinstance(element, docx.oxml.text.paragraph.CT_P):
-                paragraph = docx.text.paragraph.Paragraph(element, doc)
-                paragraph_text = paragraph.text
-                if not paragraph_text:
-                    continue
-                font_sizes = []
-                alignments = []
-                font_weights = []
-                for run in paragraph.runs:
-                    font_size = run.font.size.pt if run.font.size else 0
-                    font_sizes.append(font_size)
-                    alignment_types = {
-                        WD_ALIGN_PARAGRAPH.LEFT: 'left',
-                        WD_ALIGN_PARAGRAPH.CENTER: 'center',
-                        WD_ALIGN_PARAGRAPH.JUSTIFY: 'justify',
-                        WD_ALIGN_PARAGRAPH.RIGHT: 'right',
-                        None: 'NoneStyle'
-                    }
-                    alignment = alignment_types.get(paragraph.alignment, 'NoneStyle')
-                    alignments.append(alignment)
-                    if run.font.bold:
-                        font_weights.append("bold")
-                    if run.font.italic:
-                        font_weights.append("italic")
-                    if run.font.underline:
-                        font_weights.append("underline")
-                    if not font_weights:
-                        font_weights.append("normal")
-                alignment_row = 'mix' if len(set(alignments)) != 1 else alignments[0] 
-                output_lines.append([element_index, paragraph_text, min(font_sizes), alignment_row, font_weights])
-                element_index += 1
-            elif isinstance(element, docx.oxml.table.CT_Tbl):
-                if element_index != 0:
-                    table_header = output_lines[element_index - 1][3]
-                else:
-                    table_header = "mix"
-                for table in doc.tables:
-                    num_rows = len(table.rows)
-                    num_cols = len(table.columns)
-                    if num_rows > 1 and num_cols > 0:
-                        headers = [cell.text for cell in table.rows[0].cells]
-                        if table_header == "center":
-                            for i in range(1, num_rows):
-                                cells = table.rows[i].cells
-                                output_lines.append([element_index, f"    * {i}", 1, 'mix', 'normal'])
-                                element_index += 1
-                                for j in range(num_cols):
-                                    output_lines.append([element_index, f"        * {headers[j]}", 1, 'mix', 'normal'])
-                                    element_index += 1
-                                    try:
-                                        table_cell = cells[j].text
-                                        table_cell = re.sub(r'\s+', ' ', table_cell)
-                                        output_lines.append([element_index, f"            * {table_cell}", 1, 'mix', 'normal'])
-                                    except IndexError:
-                                        output_lines.append([element_index, f"            * N/A", 1, 'mix', 'normal'])
-                                    element_index += 1
-                        else:
-                            output_lines.append([element_index, headers[0], 1, 'mix', 'normal'])
-                            element_index += 1
-                            for i in range(1, num_rows):
-                                cells = table.rows[i].cells
-                                try:
-                                    table_cell_id = cells[0].text
-                                    output_lines.append([element_index, f"    * {table_cell_id}", 1, 'mix', 'normal'])
-                                except IndexError:
-                                    output_lines.append([element_index, "    * N/A", 1, 'mix', 'normal'])
-                                    element_index += 1
-                                for j in range(1, num_cols):
-                                    output_lines.append([element_index, f"        * {headers[j]}", 1, 'mix', 'normal'])
-                                    element_index += 1
-                                    try:
-                                        table_cell = cells[j].text
-                                        table_cell = re.sub(r'\s+', ' ', table_cell)
-                                        output_lines.append([element_index, f"            * {table_cell}", 1, 'mix', 'normal'])
-                                    except IndexError:
-                                        output_lines.append([element_index, "            * N/A", 1, 'mix', 'normal'])
-                                    element_index += 1
-        h1_config = []
-        if "italic" not in output_lines[0][4] and "bold" in output_lines[0][4] and "center" in output_lines[0][3]:
-            output_lines[0][1] = "# " + output_lines[0][1]
-            h1_config = [output_lines[0][2], output_lines[0][3], output_lines[0][4]]
-            excepts_headers = []
-            for i in range(1, len(output_lines)):
-                if output_lines[i][2] == h1_config[0] and output_lines[i][3] == h1_config[1] and output_lines[i][4] == h1_config[2]:
-                    output_lines[0][1] += f" {output_lines[i][1]}" 
-                    excepts_headers.append(i)
-                else:
-                    break
-            for item in excepts_headers:
-                output_lines.pop(item)
-            h2_config = []
-            for i in range(1, len(output_lines)):
-                if not output_lines[i][1].lstrip().startswith("*"):
-                    if int(output_lines[i][2]) == 9 and output_lines[i][3] == 'center' and 'bold' in output_lines[i][4] and (len(h2_config) == 0 or (int(h2_config[0]) == 9 and h2_config[1] == "center" and "bold" in h2_config[2])):
-                        output_lines[i][1] = "## " + output_lines[i][1]
-                    elif int(h1_config[0]) == 14:
-                        if int(output_lines[i][2]) == 16 and output_lines[i][3] == 'center' and 'bold' in output_lines[i][4] and (len(h2_config) == 0 or (int(h2_config[0]) == 16 and h2_config[1] == "center" and "bold" in h2_config[2])):
-                            output_lines[i][1] = "## " + output_lines[i][1]
-                            if len(h2_config) == 0:
-                                h2_config = [output_lines[i][2], output_lines[i][3], output_lines[i][4]]
-                        elif int(output_lines[i][2]) == 13 and output_lines[i][3] == 'center' and 'bold' in output_lines[i][4] and (len(h2_config) == 0 or (int(h2_config[0]) == 13 and h2_config[1] == "center" and "bold" in h2_config[2])):
-                            output_lines[i][1] = "## " + output_lines[i][1]
-                            if len(h2_config) == 0:
-                                h2_config = [output_lines[i][2], output_lines[i][3], output_lines[i][4]]
-                        elif int(output_lines[i][2]) == 12 and output_lines[i][3] == 'center' and 'bold' in output_lines[i][4] and (len(h2_config) == 0 or (int(h2_config[0]) == 12 and h2_config[1] == "center" and "bold" in h2_config[2])):
-                            output_lines[i][1] = "## " + output_lines[i][1]
-                            if len(h2_config) == 0:
-                                h2_config = [output_lines[i][2], output_lines[i][3], output_lines[i][4]]
-                        elif int(h1_config[0]) == 16:
-                            if int(output_lines[i][2]) == 14 and output_lines[i][3] == 'center' and 'bold' in output_lines[i][4] and (len(h2_config) == 0 or (int(h2_config[0]) == 14 and h2_config[1] == "center" and "bold" in h2_config[2])):
-                                output_lines[i][1] = "## " + output_lines[i][1]
-                                if len(h2_config) == 0:
-                                    h2_config = [output_lines[i][2], output_lines[i][3], output_lines[i][4]]
-            h3_config = []
-            for i in range(1, len(output_lines)):
-                if not output_lines[i][1].lstrip().startswith("*") and len(h1_config) != 0 and len(h2_config) != 0:
-                    if int(output_lines[i][2]) == 12 and output_lines[i][3] == 'justify' and output_lines[i][4] == 'bold' and int(h1_config[0]) == 16 and int(h2_config[0]) == 14 and (len(h3_config) != 0 or (output_lines[i][2] == h3_config[0] and output_lines[i][3] == h3_config[1] and output_lines[i][4] == h3_config[2])):
-                        output_lines[i][1] = "### " + output_lines[i][1]
-                        if len(h3_config) == 0:
-                            h3_config = [output_lines[i][2], output_lines[i][3], output_lines[i][4]]
-                    elif int(output_lines[i][2]) == 12 and output_lines[i][3] == 'justify' and output_lines[i][4] == 'bold' and int(h1_config[0]) == 14 and int(h2_config[0]) == 12 and (len(h3_config) != 0 or (output_lines[i][2] == h3_config[0] and output_lines[i][3] == h3_config[1] and output_lines[i][4] == h3_config[2])):
-                        output_lines[i][1] = "### " + output_lines[i][1]
-                        if len(h3_config) == 0:
-                            h3_config = [output_lines[i][2], output_lines[i][3], output_lines[i][4]]
-                    elif int(output_lines[i][2]) == 13 and output_lines[i][3] == 'justify' and output_lines[i][4] == 'bold' and int(h1_config[0]) == 14 and int(h2_config[0]) == 13 and (len(h3_config) != 0 or (output_lines[i][2] == h3_config[0] and output_lines[i][3] == h3_config[1] and output_lines[i][4] == h3_config[2])):
-                        output_lines[i][1] = "### " + output_lines[i][1]
-                        if len(h3_config) == 0:
-                            h3_config = [output_lines[i][2], output_lines[i][3], output_lines[i][4]]
-        if output_filepath and len(output_lines) > 0:
+        output_lines = read_docx_lines(doc)
+        if not output_lines:
+            return
+        mark_docx_headings(output_lines)
+        if output_filepath:
             filepath = os.path.join(DIR_TO_STORE, f"{output_filepath}.txt")
             with open(filepath, "w", encoding="utf-8") as outfile:
                 outfile.write(f"URL: {link}\n")
-                for line in output_lines:
-                    outfile.write(f"{line[1]}\n")
+                outfile.writelines(f"{line[0]}\n" for line in output_lines)
             print(f"Контент успешно сохранен в {filepath}")
     except FileNotFoundError:
         print(f"Файл не найден: {docx_filepath}")
@@ -243,28 +369,26 @@ def process_docx(docx_filepath, output_filepath, link):
     except Exception as e:
         print(f"Произошла ошибка: {e}")
 
-def parsing_docx(res, filename, link):
+def parsing_docx(content, filename, link):
     try:
+        output_filepath = extract_filename_from_url(link)
+        if output_filepath:
+            filename = f"{output_filepath}.docx"
         if not filename:
             filename = 'document.docx'
-        if not os.path.exists(DIR_TO_CACHE):
-            os.makedirs(DIR_TO_CACHE)
+        os.makedirs(DIR_TO_CACHE, exist_ok=True)
         filepath = os.path.join(DIR_TO_CACHE, filename)
         with open(filepath, 'wb') as f:
-            for chunk in res.iter_content(chunk_size=8192):
-                f.write(chunk)
-        output_filepath = extract_filename_from_url(link)
+            f.write(content)
         if output_filepath:
             process_docx(filepath, output_filepath, link)
-    except requests.exceptions.RequestException as e:
-        print(f"Ошибка при скачивании файла: {e}")
     except Exception as e:
         print(f"Произошла ошибка: {e}")
 
-def parsing_pdf(res, link):
+def parsing_pdf(data, link):
     content = []
     try:
-        pdf_file = BytesIO(res.content)
+        pdf_file = BytesIO(data)
         pdf_reader = PyPDF2.PdfReader(pdf_file)
         for page_num in range(len(pdf_reader.pages)):
             page = pdf_reader.pages[page_num]
@@ -280,13 +404,16 @@ def parsing_pdf(res, link):
     except Exception as e:
         print(f"Ошибка при парсинге - PDF '{link}': {e}")
 
-def parsing_html(res, link):
+def parsing_html(res, link, with_links=False):
     content = []
+    links = []
     try:
-        soup = BeautifulSoup(res.text, 'lxml')
+        soup = BeautifulSoup(res.text, HTML_PARSER)
         main_section = soup.find("main")
         if not main_section:
-            return False
+            return False, links
+        if with_links:
+            links = get_all_links(soup)
         header_burger_menu = main_section.find("div", {"class": "header-burger-menu"})
         if header_burger_menu:
             header_burger_menu.decompose()
@@ -428,59 +555,187 @@ def parsing_html(res, link):
             print(f"Контент успешно сохранен в {filepath}")
     except Exception as e:
         print(f"Ошибка при парсинге - HTML '{link}': {e}")
-    return True
+    return True, links
 
-def get_all_links(res, link):
-    content = []
-    try:
-        soup = BeautifulSoup(res.text, 'lxml')
-        links = soup.find_all('a')
-        for i in range(len(links)):
-            item = links[i].get('href')
-            new_link = transform_link(item)
-            if new_link:
-                content.append(new_link)
-    except Exception as e:
-        print(f"Ошибка при парсинге links from HTML '{link}': {e}")
-    parsing_list = np.array(content)
-    parsing_list = np.unique(parsing_list)
-    return parsing_list
+def get_all_links(soup):
+    content = {}
+    for anchor in soup.find_all('a', href=True):
+        new_link = transform_link(anchor.get('href'))
+        if new_link:
+            content[new_link] = None
+    return list(content)
 
-def parsing(link, time_start=6, time_finish=12):
-    links = []
+class ConversionTimeout(BaseException):
+    pass
+
+def raise_conversion_timeout(signum, frame):
+    raise ConversionTimeout()
+
+def limit_conversion_worker():
+    if resource is not None and CONVERT_MEMORY_LIMIT_MB:
+        limit = CONVERT_MEMORY_LIMIT_MB * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+def convert_document(content, link):
+    use_alarm = hasattr(signal, "SIGALRM")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, raise_conversion_timeout)
+        signal.alarm(CONVERT_TIMEOUT)
     try:
-        delay = round(random.uniform(time_start, time_finish), 1)
-        time.sleep(delay)
-        r = requests.get(link, timeout=16)
         if link.endswith(".docx"):
-            filename = get_filename_from_url(link)
-            parsing_docx(r, filename, link)
-        elif link.endswith(".pdf"):
-            parsing_pdf(r, link)
+            parsing_docx(content, get_filename_from_url(link), link)
         else:
-            is_parse = parsing_html(r, link)
-            if is_parse and REPARSING_DATA:
-                links_list = get_all_links(r, link)
-                if len(links_list) > 0:
-                    for item in links_list:
-                        if item not in links:
-                            links.append(item)
+            parsing_pdf(content, link)
+    finally:
+        if use_alarm:
+            signal.alarm(0)
+
+class ConversionStage:
+    def __init__(self, workers=CONVERT_WORKERS, max_pending=CONVERT_MAX_PENDING):
+        self.workers = workers
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.pool = self._create_pool()
+
+    def _create_pool(self):
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=limit_conversion_worker,
+        )
+
+    def submit(self, content, link, on_success):
+        self.slots.acquire()
+        with self.lock:
+            self.pending.add(link)
+            try:
+                future = self.pool.submit(convert_document, content, link)
+            except BrokenProcessPool:
+                self.pool = self._create_pool()
+                future = self.pool.submit(convert_document, content, link)
+        future.add_done_callback(lambda done: self._finish(done, link, on_success))
+
+    def _finish(self, future, link, on_success):
+        self.slots.release()
+        if future.cancelled():
+            return
+        with self.lock:
+            self.pending.discard(link)
+        try:
+            future.result()
+        except ConversionTimeout:
+            print(f"Превышено время конвертации ({CONVERT_TIMEOUT} сек): '{link}'")
+            return
+        except BrokenProcessPool:
+            print(f"Процесс конвертации аварийно завершился: '{link}'")
+            return
+        except Exception as e:
+            print(f"Ошибка при конвертации '{link}': {e}")
+            return
+        on_success()
+
+    def pending_links(self):
+        with self.lock:
+            return set(self.pending)
+
+    def shutdown(self, cancel=False):
+        self.pool.shutdown(wait=True, cancel_futures=cancel)
+
+conversion_stage = None
+
+def get_output_path(link):
+    output_filepath = extract_filename_from_url(link)
+    if not output_filepath:
+        return None
+    return os.path.join(DIR_TO_STORE, f"{output_filepath}.txt")
+
+def parsing(link):
+    links = []
+    try:
+        rate_limiter.wait(link)
+        headers = fetch_cache.conditional_headers(link, need_links=REPARSING_DATA)
+        r = session.get(link, timeout=REQUEST_TIMEOUT, headers=headers)
+        if r.status_code == 304:
+            print(f"Не изменилось (304): '{link}'")
+            return list(fetch_cache.get(link)["links"] or []) if REPARSING_DATA else links
+        content_hash = hashlib.sha256(r.content).hexdigest()
+        cached = fetch_cache.get(link, need_links=REPARSING_DATA)
+        if cached and cached["sha256"] == content_hash:
+            print(f"Содержимое не изменилось: '{link}'")
+            if r.status_code == 200:
+                fetch_cache.refresh_validators(link, r.headers)
+            return list(cached["links"] or []) if REPARSING_DATA else links
+        headers = dict(r.headers)
+        if link.endswith(".docx") or link.endswith(".pdf"):
+            def remember_document():
+                if r.status_code == 200:
+                    fetch_cache.update(link, headers, content_hash, [] if REPARSING_DATA else None, get_output_path(link))
+            if conversion_stage is not None:
+                conversion_stage.submit(r.content, link, remember_document)
+            else:
+                convert_document(r.content, link)
+                remember_document()
+            return links
+        is_parse, page_links = parsing_html(r, link, with_links=REPARSING_DATA)
+        if is_parse and REPARSING_DATA:
+            links = page_links
+        if r.status_code == 200:
+            fetch_cache.update(link, headers, content_hash, links if REPARSING_DATA else None, get_output_path(link))
     except requests.exceptions.Timeout:
         print(f"Время ожидания истекло для '{link}'")
+    except requests.exceptions.RequestException as e:
+        print(f"Ошибка при загрузке '{link}': {e}")
     return links
 
+def create_frontier():
+    if REPARSING_DATA and os.path.exists(CRAWL_CHECKPOINT_PATH):
+        frontier = CrawlFrontier.from_checkpoint(CRAWL_CHECKPOINT_PATH)
+        print(f"Продолжаем обход: в очереди {len(frontier)} ссылок, посещено {len(frontier.visited)}")
+        return frontier
+    frontier = CrawlFrontier(CRAWL_CHECKPOINT_PATH)
+    for link in load_links_from_file(FILE_TO_PARSE):
+        frontier.add(link, force=True)
+    return frontier
+
 def get_parsed_list():
-    to_parse = load_links_from_file(FILE_TO_PARSE)
-    exception_links = extract_urls_from_txt_files(DIR_TO_STORE)
-    while to_parse:
-        item = to_parse.pop(0)
-        new_links_list = parsing(item)
-        if len(new_links_list) > 0:
-            for element in new_links_list:
-                if element not in exception_links:
-                    exception_links.append(element)
+    global conversion_stage
+    frontier = create_frontier()
+    parsed_count = 0
+    started = time.perf_counter()
+    conversion_stage = ConversionStage()
+    try:
+        with ThreadPoolExecutor(max_workers=CRAWL_WORKERS) as executor:
+            in_flight = {}
+            while frontier or in_flight:
+                while frontier and len(in_flight) < CRAWL_WORKERS:
+                    link = frontier.pop()
+                    in_flight[executor.submit(parsing, link)] = link
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    link = in_flight.pop(future)
                     if REPARSING_DATA:
-                        to_parse.append(element)
+                        for element in future.result():
+                            frontier.add(element)
+                    frontier.done(link)
+                    parsed_count += 1
+                    if parsed_count % CHECKPOINT_EVERY == 0:
+                        fetch_cache.save()
+                        if REPARSING_DATA:
+                            frontier.save(conversion_stage.pending_links())
+    except BaseException:
+        conversion_stage.shutdown(cancel=True)
+        fetch_cache.save()
+        if REPARSING_DATA:
+            frontier.save(conversion_stage.pending_links())
+            print(f"Обход прерван, состояние сохранено в {CRAWL_CHECKPOINT_PATH}")
+        raise
+    print("Ожидание завершения конвертации документов...")
+    conversion_stage.shutdown()
+    fetch_cache.save()
+    frontier.clear_checkpoint()
+    elapsed = time.perf_counter() - started
+    print(f"Обработано {parsed_count} ссылок за {elapsed:.1f} сек")
 
 if __name__ == "__main__":
     get_parsed_list()
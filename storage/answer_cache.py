@@ -0,0 +1,150 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from storage.shared import connect
+
+def normalize_vector(embedding):
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+class AnswerCache:
+    def __init__(self, max_size=512, ttl=3600, threshold=0.95):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def _drop_expired(self, now):
+        expired = [key for key, entry in self.entries.items() if now - entry["created"] > self.ttl]
+        for key in expired:
+            del self.entries[key]
+
+    def lookup(self, embedding):
+        query = normalize_vector(embedding)
+        with self.lock:
+            self._drop_expired(time.time())
+            if not self.entries:
+                self.misses += 1
+                return None
+            keys = list(self.entries)
+            matrix = np.stack([self.entries[key]["vector"] for key in keys])
+            similarities = matrix @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(keys[best])
+            self.hits += 1
+            entry = self.entries[keys[best]]
+            return entry["answer"], list(entry["links"])
+
+    def store(self, key, embedding, answer, links):
+        with self.lock:
+            self.entries[key] = {
+                "vector": normalize_vector(embedding),
+                "answer": answer,
+                "links": list(links),
+                "created": time.time(),
+            }
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def invalidate(self, before):
+        with self.lock:
+            stale = [key for key, entry in self.entries.items() if entry["created"] < before]
+            for key in stale:
+                del self.entries[key]
+
+    def stats(self):
+        with self.lock:
+            return {"size": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+class SQLiteAnswerCache:
+    def __init__(self, path, max_size=512, ttl=3600, threshold=0.95):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.connection = connect(path)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS answers (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                answer TEXT NOT NULL,
+                links TEXT NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self.connection.commit()
+
+    def lookup(self, embedding):
+        query = normalize_vector(embedding)
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM answers WHERE created < ?", (now - self.ttl,))
+            rows = self.connection.execute("SELECT key, vector FROM answers").fetchall()
+            if not rows:
+                self.misses += 1
+                return None
+            matrix = np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+            similarities = matrix @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+            key = rows[best][0]
+            self.connection.execute("UPDATE answers SET last_used = ? WHERE key = ?", (now, key))
+            answer, links = self.connection.execute(
+                "SELECT answer, links FROM answers WHERE key = ?", (key,)
+            ).fetchone()
+            self.hits += 1
+            return answer, json.loads(links)
+
+    def store(self, key, embedding, answer, links):
+        now = time.time()
+        vector = normalize_vector(embedding).tobytes()
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO answers (key, vector, answer, links, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, vector, answer, json.dumps(list(links), ensure_ascii=False), now, now)
+            )
+            self.connection.execute(
+                "DELETE FROM answers WHERE key NOT IN "
+                "(SELECT key FROM answers ORDER BY last_used DESC LIMIT ?)",
+                (self.max_size,)
+            )
+
+    def clear(self):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM answers")
+
+    def invalidate(self, before):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM answers WHERE created < ?", (before,))
+
+    def stats(self):
+        with self.lock:
+            size = self.connection.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        return {"size": size, "hits": self.hits, "misses": self.misses}
+
+def create_answer_cache(backend, path, max_size, ttl, threshold):
+    if backend == "memory":
+        return AnswerCache(max_size=max_size, ttl=ttl, threshold=threshold)
+    if backend == "sqlite":
+        return SQLiteAnswerCache(path, max_size=max_size, ttl=ttl, threshold=threshold)
+    raise ValueError(f"Unknown answer cache backend: {backend}")
@@ -0,0 +1,63 @@
+import json
+import os
+
+CHUNK_INDEX_FILE = "chunk_index.json"
+
+def build_chunk_index(documents, metadatas):
+    index = {}
+    for text, metadata in zip(documents, metadatas):
+        chunk_id = metadata.get("chunk_id")
+        if chunk_id is None:
+            continue
+        index[str(chunk_id)] = {"url": metadata.get("url"), "text": text, "prev": None, "next": None}
+    for chunk_id, entry in index.items():
+        prev_entry = index.get(str(int(chunk_id) - 1))
+        if prev_entry and prev_entry["url"] == entry["url"]:
+            entry["prev"] = str(int(chunk_id) - 1)
+        next_entry = index.get(str(int(chunk_id) + 1))
+        if next_entry and next_entry["url"] == entry["url"]:
+            entry["next"] = str(int(chunk_id) + 1)
+    return index
+
+def save_chunk_index(index, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as outfile:
+        json.dump(index, outfile, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+class ChunkIndex:
+    def __init__(self, path, fallback_loader=None):
+        self.path = path
+        self.fallback_loader = fallback_loader
+        self.entries = {}
+        self.mtime = None
+
+    def refresh(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            if self.mtime is None and self.fallback_loader is not None:
+                self.entries = build_chunk_index(*self.fallback_loader())
+                self.mtime = 0
+                return True
+            return False
+        if mtime == self.mtime:
+            return False
+        with open(self.path, "r", encoding="utf-8") as infile:
+            self.entries = json.load(infile)
+        self.mtime = mtime
+        return True
+
+    def get(self, chunk_id):
+        return self.entries.get(str(chunk_id))
+
+    def window(self, chunk_id):
+        entry = self.get(chunk_id)
+        if entry is None:
+            return []
+        ids = [str(chunk_id)]
+        if entry["prev"]:
+            ids.insert(0, entry["prev"])
+        if entry["next"]:
+            ids.append(entry["next"])
+        return ids
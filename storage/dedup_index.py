@@ -0,0 +1,89 @@
+import os
+import re
+import zlib
+import numpy as np
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+TOKEN_PATTERN = re.compile(r"\w+")
+
+class DedupIndex:
+    def __init__(self, threshold=0.8, num_perm=128, bands=16, shingle_size=3, seed=1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        generator = np.random.RandomState(seed)
+        self.a = generator.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.b = generator.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.signatures = {}
+        self.buckets = {}
+        self.near_duplicates = 0
+
+    def shingles(self, text):
+        tokens = TOKEN_PATTERN.findall(text.lower())
+        if len(tokens) <= self.shingle_size:
+            return {" ".join(tokens)}
+        return {" ".join(tokens[i:i + self.shingle_size]) for i in range(len(tokens) - self.shingle_size + 1)}
+
+    def signature(self, text):
+        hashes = np.array([zlib.crc32(shingle.encode()) for shingle in self.shingles(text)], dtype=np.uint64)
+        permuted = np.bitwise_and((np.outer(hashes, self.a) + self.b) % MERSENNE_PRIME, MAX_HASH)
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def find_duplicate(self, chunk_hash, text):
+        if chunk_hash in self.signatures:
+            return chunk_hash
+        signature = self.signature(text)
+        candidates = set()
+        for key in self._band_keys(signature):
+            candidates.update(self.buckets.get(key, ()))
+        for candidate in candidates:
+            if np.mean(self.signatures[candidate] == signature) >= self.threshold:
+                self.near_duplicates += 1
+                return candidate
+        return None
+
+    def add(self, chunk_hash, text=None, signature=None):
+        if signature is None:
+            signature = self.signature(text)
+        self.signatures[chunk_hash] = signature
+        for key in self._band_keys(signature):
+            self.buckets.setdefault(key, set()).add(chunk_hash)
+
+    def remove(self, chunk_hash):
+        signature = self.signatures.pop(chunk_hash, None)
+        if signature is None:
+            return
+        for key in self._band_keys(signature):
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                bucket.discard(chunk_hash)
+                if not bucket:
+                    del self.buckets[key]
+
+    def __contains__(self, chunk_hash):
+        return chunk_hash in self.signatures
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def save(self, path):
+        keys = list(self.signatures)
+        matrix = np.stack([self.signatures[key] for key in keys]) if keys else np.zeros((0, self.num_perm), dtype=np.uint32)
+        tmp_path = path + ".tmp.npz"
+        np.savez_compressed(tmp_path, keys=np.array(keys), signatures=matrix)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        data = np.load(path)
+        if data["signatures"].shape[1:] != (self.num_perm,):
+            return False
+        for key, signature in zip(data["keys"], data["signatures"]):
+            self.add(str(key), signature=signature)
+        return True
@@ -0,0 +1,78 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+import snowballstemmer
+
+LEXICAL_INDEX_FILE = "bm25_index.json"
+TOKEN_PATTERN = re.compile(r"\d+(?:[.,:/-]\d+)+|[^\W_]+")
+russian_stemmer = snowballstemmer.stemmer("russian")
+
+def stem(token):
+    if token[0].isdigit():
+        return token
+    return russian_stemmer.stemWord(token)
+
+def tokenize(text):
+    return [stem(token) for token in TOKEN_PATTERN.findall(text.lower().replace("ё", "е"))]
+
+def build_lexical_index(chunk_ids, texts):
+    postings = {}
+    doc_lengths = {}
+    for chunk_id, text in zip(chunk_ids, texts):
+        terms = Counter(tokenize(text))
+        doc_lengths[str(chunk_id)] = sum(terms.values())
+        for term, frequency in terms.items():
+            postings.setdefault(term, []).append([str(chunk_id), frequency])
+    average_length = sum(doc_lengths.values()) / len(doc_lengths) if doc_lengths else 0
+    return {"doc_lengths": doc_lengths, "average_length": average_length, "postings": postings}
+
+def save_lexical_index(index, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as outfile:
+        json.dump(index, outfile, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+class LexicalIndex:
+    def __init__(self, path, fallback_loader=None, k1=1.5, b=0.75):
+        self.path = path
+        self.fallback_loader = fallback_loader
+        self.k1 = k1
+        self.b = b
+        self.index = build_lexical_index([], [])
+        self.mtime = None
+
+    def refresh(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            if self.mtime is None and self.fallback_loader is not None:
+                self.index = build_lexical_index(*self.fallback_loader())
+                self.mtime = 0
+                return True
+            return False
+        if mtime == self.mtime:
+            return False
+        with open(self.path, "r", encoding="utf-8") as infile:
+            self.index = json.load(infile)
+        self.mtime = mtime
+        return True
+
+    def search(self, query, k=5):
+        index = self.index
+        doc_lengths = index["doc_lengths"]
+        total = len(doc_lengths)
+        if not total:
+            return []
+        average_length = index["average_length"] or 1
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = index["postings"].get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, frequency in postings:
+                norm = self.k1 * (1 - self.b + self.b * doc_lengths[chunk_id] / average_length)
+                scores[chunk_id] = scores.get(chunk_id, 0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
@@ -0,0 +1,169 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from langchain_core.messages import messages_from_dict, messages_to_dict
+from storage.shared import connect
+
+EVICTION_INTERVAL = 60
+
+class MemorySessionStore:
+    def __init__(self, max_messages=20, idle_ttl=604800, max_sessions=10000):
+        self.max_messages = max_messages
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()
+        self.last_eviction = time.time()
+        self.lock = threading.Lock()
+
+    def get_messages(self, session_id):
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return []
+            return list(session["messages"])
+
+    def get_summary(self, session_id):
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return ""
+            return session["summary"]
+
+    def fold_messages(self, session_id, count, summary, previous=""):
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None or session["summary"] != previous:
+                return False
+            del session["messages"][:count]
+            session["summary"] = summary
+            return True
+
+    def append_messages(self, session_id, messages):
+        now = time.time()
+        with self.lock:
+            session = self.sessions.setdefault(session_id, {"messages": [], "summary": "", "last_seen": now})
+            session["messages"].extend(messages)
+            del session["messages"][:-self.max_messages]
+            session["last_seen"] = now
+            self.sessions.move_to_end(session_id)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+            if now - self.last_eviction > EVICTION_INTERVAL:
+                self._evict_idle(now)
+
+    def reset(self, session_id):
+        with self.lock:
+            self.sessions.pop(session_id, None)
+
+    def _evict_idle(self, now):
+        self.last_eviction = now
+        while self.sessions:
+            session_id, session = next(iter(self.sessions.items()))
+            if now - session["last_seen"] <= self.idle_ttl:
+                break
+            del self.sessions[session_id]
+
+class SQLiteSessionStore:
+    def __init__(self, path, max_messages=20, idle_ttl=604800):
+        self.max_messages = max_messages
+        self.idle_ttl = idle_ttl
+        self.last_eviction = 0
+        self.lock = threading.Lock()
+        self.connection = connect(path)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                last_seen REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                message TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS summaries (
+                session_id TEXT PRIMARY KEY,
+                summary TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, id);
+            CREATE INDEX IF NOT EXISTS sessions_last_seen ON sessions (last_seen);
+        """)
+        self.connection.commit()
+
+    def get_messages(self, session_id):
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT message FROM messages WHERE session_id = ? ORDER BY id",
+                (session_id,)
+            ).fetchall()
+        return messages_from_dict([json.loads(row[0]) for row in rows])
+
+    def get_summary(self, session_id):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT summary FROM summaries WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return row[0] if row else ""
+
+    def fold_messages(self, session_id, count, summary, previous=""):
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT summary FROM summaries WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if (row[0] if row else "") != previous:
+                return False
+            self.connection.execute(
+                "DELETE FROM messages WHERE id IN "
+                "(SELECT id FROM messages WHERE session_id = ? ORDER BY id LIMIT ?)",
+                (session_id, count)
+            )
+            self.connection.execute(
+                "INSERT INTO summaries (session_id, summary) VALUES (?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET summary = excluded.summary",
+                (session_id, summary)
+            )
+        return True
+
+    def append_messages(self, session_id, messages):
+        now = time.time()
+        rows = [(session_id, json.dumps(item, ensure_ascii=False)) for item in messages_to_dict(messages)]
+        with self.lock, self.connection:
+            self.connection.executemany("INSERT INTO messages (session_id, message) VALUES (?, ?)", rows)
+            self.connection.execute(
+                "DELETE FROM messages WHERE session_id = ? AND id NOT IN "
+                "(SELECT id FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?)",
+                (session_id, session_id, self.max_messages)
+            )
+            self.connection.execute(
+                "INSERT INTO sessions (session_id, last_seen) VALUES (?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET last_seen = excluded.last_seen",
+                (session_id, now)
+            )
+            if now - self.last_eviction > EVICTION_INTERVAL:
+                self._evict_idle(now)
+
+    def reset(self, session_id):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            self.connection.execute("DELETE FROM summaries WHERE session_id = ?", (session_id,))
+            self.connection.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def _evict_idle(self, now):
+        self.last_eviction = now
+        threshold = now - self.idle_ttl
+        self.connection.execute(
+            "DELETE FROM messages WHERE session_id IN (SELECT session_id FROM sessions WHERE last_seen < ?)",
+            (threshold,)
+        )
+        self.connection.execute(
+            "DELETE FROM summaries WHERE session_id IN (SELECT session_id FROM sessions WHERE last_seen < ?)",
+            (threshold,)
+        )
+        self.connection.execute("DELETE FROM sessions WHERE last_seen < ?", (threshold,))
+
+def create_session_store(backend, path, max_messages, idle_ttl):
+    if backend == "memory":
+        return MemorySessionStore(max_messages=max_messages, idle_ttl=idle_ttl)
+    if backend == "sqlite":
+        return SQLiteSessionStore(path, max_messages=max_messages, idle_ttl=idle_ttl)
+    raise ValueError(f"Unknown session backend: {backend}")